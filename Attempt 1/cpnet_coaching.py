@@ -28,13 +28,77 @@ class CPRule:
         return f"If {self.condition} then {self.ordering}"
 
 
+class CompiledCPTable:
+    MAX_PARENTS = 20   # Tables with more parents are not compiled (2^parents entries).
+
+    def __init__(self, cp_table, variables):
+        """
+        Compiled form of a CP-table over binary outcomes given as tuples in the order of `variables`:
+        for each assignment of its parents (bit-packed, as an index), the preferred value and the rule it comes from,
+        i.e., the last applicable rule (or None), so that a flip check is a lookup instead of a scan of all rules.
+        Rules conditioned on variables that are not in `variables`, or on non-binary values, never apply to binary outcomes, so they are left out.
+        """
+        self.position = variables.index(cp_table.variable)
+        positions = {var: i for i, var in enumerate(variables)}
+        rules = [rule for rule in cp_table.rules
+                 if all(var in positions and val in ("0", "1") for var, val in rule.condition.items())]
+        self.parents = sorted({positions[var] for rule in rules for var in rule.condition})
+        if len(self.parents) > self.MAX_PARENTS:
+            raise ValueError(f"Too many parents to compile the CP-table of {cp_table.variable}.")
+        bits = {position: 1 << bit for bit, position in enumerate(self.parents)}
+        self.preferred = [None] * (1 << len(self.parents))
+        self.rules = [None] * (1 << len(self.parents))
+        full = len(self.rules) - 1
+        for rule in rules:   # Later rules take over, as in CPTable.get_preference.
+            mask = sum(bits[positions[var]] for var in rule.condition)
+            fixed = sum(bits[positions[var]] for var, val in rule.condition.items() if val == "1")
+            free = full & ~mask
+            sub = free
+            while True:   # All assignments that agree with the condition.
+                self.preferred[fixed | sub] = rule.ordering[0]
+                self.rules[fixed | sub] = rule
+                if sub == 0:
+                    break
+                sub = (sub - 1) & free
+        self.preferred_bits = [{"0": 0, "1": 1}.get(val, -1) for val in self.preferred]   # -1: no rule, or a non-binary preference.
+
+    def is_flip_justified(self, outcome):
+        """Same as is_flip_justified, for an outcome tuple of "0"/"1" values."""
+        index = 0
+        for bit, position in enumerate(self.parents):
+            if outcome[position] == "1":
+                index |= 1 << bit
+        rule = self.rules[index]
+        if rule is None:
+            return False, "No applicable rule."
+        current_val = outcome[self.position]
+        if current_val != self.preferred[index]:
+            return False, f"Current value {current_val} ≠ preferred {self.preferred[index]}."
+        return True, f"Justified by rule {rule.condition}."
+
+
 class CPTable:
     def __init__(self, variable):
         self.variable = variable   # The variable for which this table applies.
         self.rules = []            # List of CPRule objects (initially empty).
+        self._compiled = None      # (variables, CompiledCPTable or None) of the last compilation, if still valid.
 
     def add_rule(self, condition, ordering):
         self.rules.append(CPRule(condition, ordering))
+        self._compiled = None
+
+    def compiled(self, variables):
+        """
+        The compiled form of this table over outcomes in the order of `variables` (or None if it has too many parents),
+        compiled again only if rules have been added (or variables renamed) since the last time.
+        """
+        key = tuple(variables)
+        if self._compiled is None or self._compiled[0] != key:
+            try:
+                self._compiled = (key, CompiledCPTable(self, variables))
+            except ValueError:
+                self._compiled = (key, None)
+        return self._compiled[1]
 
     def get_dependencies(self):
         deps = set()
@@ -133,6 +197,7 @@ def is_flip_justified(cp_table, outcome):
       (a) There is an applicable rule whose conclusion equals the current (preferred) value.
       (b) And no higher-priority applicable rule favors the inverse value.
     Returns (True, explanation) if justified; otherwise (False, explanation).
+    Since the applied rule is the last applicable one, (b) always holds; see also CompiledCPTable.is_flip_justified.
     """
     applied_rule = None
     for rule in cp_table.rules:
@@ -151,6 +216,70 @@ def is_flip_justified(cp_table, outcome):
             return False, f"Higher rule {higher_rule.condition} favors {inverse}."
     return True, f"Justified by rule {applied_rule.condition}."
 
+BITMAP_MAX_VARIABLES = 25   # Visited outcomes are kept in a bytearray over all 2^n outcomes (32 MiB at most), in a dict beyond that.
+
+def bits_to_tuple(outcome, n):
+    """Converts a bit-packed outcome (bit i being the value of the i-th variable) into a tuple of "0"/"1" values."""
+    return tuple("1" if outcome >> i & 1 else "0" for i in range(n))
+
+def find_worsening_flipping_sequence_bits(cpnet, source, target):
+    """
+    Same search (and result) as find_worsening_flipping_sequence, over bit-packed binary outcomes: outcomes are ints, flips are XORs
+    and distances are popcounts, while flips are checked against compiled CP-tables (see CompiledCPTable). Each visited outcome keeps
+    the variable flipped to reach it (the parent outcome being the same XOR), so the sequence is rebuilt, with its justifications, at the end.
+    Returns None if the outcomes are not binary or a CP-table could not be compiled.
+    """
+    variables = cpnet.variables
+    n = len(variables)
+    if not all(outcome[var] in ("0", "1") for outcome in (source, target) for var in variables):
+        return None
+    tables = [cpnet.cpt[var].compiled(variables) for var in variables]
+    if any(table is None for table in tables):
+        return None
+    src = sum(1 << i for i, var in enumerate(variables) if source[var] == "1")
+    tgt = sum(1 << i for i, var in enumerate(variables) if target[var] == "1")
+    checks = [(i, 1 << i, list(enumerate(table.parents)), table.preferred_bits) for i, table in enumerate(tables)]
+    visited = bytearray(1 << n) if n <= BITMAP_MAX_VARIABLES else {}   # Outcome -> 1 + the variable flipped to reach it.
+    seen = visited.get if isinstance(visited, dict) else visited.__getitem__
+    visited[src] = 255
+    queue = deque([src])
+    best, best_d = src, (src ^ tgt).bit_count()
+    found = False
+    while queue:
+        current = queue.popleft()
+        if current == tgt:
+            found = True
+            break
+        for i, flip, parents, preferred in checks:
+            index = 0
+            for bit, position in parents:
+                if current >> position & 1:
+                    index |= 1 << bit
+            if preferred[index] != current >> i & 1:
+                continue
+            new_outcome = current ^ flip
+            if not seen(new_outcome):
+                visited[new_outcome] = i + 1
+                if new_outcome == tgt:   # Its parent is settled, so there is no need to wait until it is dequeued.
+                    found = True
+                    break
+                queue.append(new_outcome)
+                d = (new_outcome ^ tgt).bit_count()
+                if d < best_d:
+                    best, best_d = new_outcome, d
+        if found:
+            break
+    seq = []
+    cur = tgt if found else best
+    while cur != src:
+        i = visited[cur] - 1
+        parent = cur ^ (1 << i)
+        justification = tables[i].is_flip_justified(bits_to_tuple(parent, n))[1]
+        seq.append((variables[i], justification, bits_to_tuple(cur, n)))
+        cur = parent
+    seq.reverse()
+    return seq, found
+
 def find_worsening_flipping_sequence(cpnet, source, target):
     """
     Starting from the source outcome (more preferred), performs a BFS over outcomes by applying worsening flips.
@@ -158,11 +287,17 @@ def find_worsening_flipping_sequence(cpnet, source, target):
     Returns (sequence, exact) where sequence is a list of tuples:
         (flipped_variable, justification, new outcome tuple)
     and exact is True if the target was reached.
-    (Assumes binary domains.)
+    (Assumes binary domains.) Flips are checked against compiled CP-tables (see CompiledCPTable), unless the source is not binary.
+    Binary outcomes are searched bit-packed (see find_worsening_flipping_sequence_bits) whenever all CP-tables compile.
     """
+    result = find_worsening_flipping_sequence_bits(cpnet, source, target)
+    if result is not None:
+        return result
     variables = cpnet.variables
     src = outcome_to_tuple(source, variables)
     tgt = outcome_to_tuple(target, variables)
+    binary = all(val in ("0", "1") for val in src)
+    tables = [cpnet.cpt[var].compiled(variables) if binary else None for var in variables]
     visited = {src: (None, None, None)}
     queue = deque([src])
     best, best_d = src, hamming_distance(src, tgt)
@@ -172,12 +307,17 @@ def find_worsening_flipping_sequence(cpnet, source, target):
         if current == tgt:
             found = True
             break
-        curr_outcome = {var: val for var, val in zip(variables, current)}
+        curr_outcome = None
         for i, var in enumerate(variables):
-            justified, justification = is_flip_justified(cpnet.cpt[var], curr_outcome)
+            if tables[i] is not None:
+                justified, justification = tables[i].is_flip_justified(current)
+            else:
+                if curr_outcome is None:
+                    curr_outcome = {var: val for var, val in zip(variables, current)}
+                justified, justification = is_flip_justified(cpnet.cpt[var], curr_outcome)
             if justified:
                 new_outcome = list(current)
-                new_outcome[i] = "1" if curr_outcome[var] != "1" else "0"
+                new_outcome[i] = "1" if current[i] != "1" else "0"
                 new_tuple = tuple(new_outcome)
                 if new_tuple not in visited:
                     visited[new_tuple] = (current, var, justification)
@@ -549,6 +689,7 @@ class CPNetGUI:
         head = self.head_var_adv.get()
         ordering = ["1", "0"] if self.ordering_adv.get() == "1>0" else ["0", "1"]
         self.cpnet.cpt[head].add_rule(conditions, ordering)
+        self.cpnet.cpt[head].compiled(self.cpnet.variables)   # Only the table of the head needs compiling again.
         messagebox.showinfo("Advice Added", f"Rule added: if {conditions} then {ordering} for {head}")
         self.update_cpt_display()
         self.update_graph()
@@ -1,91 +1,182 @@
 # animate.py
 
 import os
-import sys
-import itertools as it
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 from matplotlib import pyplot as plt
 
 from matplotlib import animation as animation
 
+from traces import read_binary_traces, TraceStore, TextTraceIndex
+from catalogue import Catalogue, CATALOGUE_NAME
+
+def unique_states(states: list[list[int]]) -> list[list[int]]:
+    """ Drops repeated states (keeping their first occurrence), through a set of hashed tuples. """
+    seen = set()
+    unique = []
+    for state in states:
+        key = tuple(state)
+        if key not in seen:
+            seen.add(key)
+            unique.append(state)
+    return unique
+
 class SortingAnimator:
-    def __init__(self, traces_path: str, interval: int = 400) -> None:
+    def __init__(self, traces_path: str, interval: int = 400, catalogue_path: str | None = None) -> None:
         self.ALGORITHMS = {
             "b": "Bubble sort",
             "q": "Quick sort",
             "bp": "Bubble sort (partial)",
             "qp": "Quick sort (partial)",
         }
-        self.__analyse_path(traces_path)
-        self.traces: dict[tuple[int, int], list[list[int]]] = self.__parse_traces(traces_path)
-        self.anim: animation.ArtistAnimation | None = None
+        self.__load_parameters(traces_path, catalogue_path)
+        self._store: TraceStore | None = TraceStore(traces_path) if traces_path.endswith(".tstore") else None # read lazily, through its index
+        self._index: TextTraceIndex | None = TextTraceIndex(traces_path) if traces_path.endswith(".trace") else None # same, for text traces
+        self.traces: dict[tuple[int, int], list[list[int]]] = self.__parse_binary_traces(traces_path) if traces_path.endswith(".btrace") else dict()
+        self.fig: plt.Figure | None = None
+        self.anim: animation.FuncAnimation | None = None
         self.interval: int = interval
 
+    def __load_parameters(self, path: str, catalogue_path: str | None) -> None:
+        """ Sweep parameters of the trace file, from the results catalogue (`catalogue_path`, if it exists), or else from its filename. """
+        if catalogue_path is not None and os.path.isfile(catalogue_path):
+            with Catalogue(catalogue_path) as catalogue:
+                sweeps = catalogue.sweeps(trace_file=os.path.basename(path))
+            if sweeps:
+                self._algorithm = self.ALGORITHMS[sweeps[0]["algorithm"]]
+                self._n, self._reps = sweeps[0]["N"], sweeps[0]["reps"]
+                self._mem, self._long = bool(sweeps[0]["mem"]), bool(sweeps[0]["long"])
+                return
+        self.__analyse_path(path)
+
     def __analyse_path(self, path: str) -> tuple[str, int, int, bool, bool]:
-        name_split = os.path.basename(path)[:-6].split("_")
+        name_split = os.path.splitext(os.path.basename(path))[0].split("_")
         self._algorithm = self.ALGORITHMS[name_split[0]]
         self._n = int(name_split[2][1:])
         self._reps = int(name_split[3][4:])
         self._mem = name_split[4][-1] == "y"
         self._long = name_split[5][-1] == "y"
 
-    def __parse_traces(self, path: str) -> dict[tuple[int, int], list[list[int]]]:
+    def __parse_binary_traces(self, path: str) -> dict[tuple[int, int], list[list[int]]]:
         traces = dict()
-        with open(path, "r") as file:
-            current_key = None
-            for line in file:
-                words = [x.strip() for x in line.split(";")]
-                is_header = True
-                try:
-                    _ = int(words[0])
-                except ValueError:
-                    is_header = False
-                if is_header:
-                    current_key = tuple(map(int, words))
-                    traces[current_key] = []
-                else:
-                    trace = [ [ int(w.split("=")[-1]) for w in word.split(",") ] for word in words ]
-                    trace = [ t for i, t in enumerate(trace) if t not in trace[:i] ]
-                    traces[current_key] = trace # NOTE This skips intentionally everything except for the last iteration; a more efficient way must exist
+        for key, iterations in read_binary_traces(path):
+            traces[key] = unique_states(iterations[-1] if iterations else [])
         return traces
 
+    def __get_trace(self, key: tuple[int, int]) -> list[list[int]]:
+        """ Frames of test `key`, i.e., the distinct states of its last iteration, in order. """
+        if key not in self.traces and self._index is not None:
+            self.traces[key] = unique_states(self._index.read_last(key))
+        elif key not in self.traces and self._store is not None:
+            iterations = self._store.read(key)
+            self.traces[key] = unique_states(iterations[-1] if iterations else [])
+        return self.traces[key]
+
+    def keys(self) -> list[tuple[int, int]]:
+        """ Tests `(n, i)` of the trace file. """
+        if self._index is not None:
+            return self._index.keys()
+        if self._store is not None:
+            return self._store.keys()
+        return list(self.traces.keys())
+
     def generate(self, key: tuple[int, int]) -> None:
-        artists = [] # artists that contain each frame of the animation
-        fig, ax = plt.subplots()
+        """
+        Animates test `key`: the bars are created once, and each frame only updates their heights and colours (with blitting),
+        so that memory does not grow with the number of frames.
+        """
+        traces = self.__get_trace(key)
+        if not traces:
+            raise ValueError(f"No states to animate for test {key}")
+        self.fig, ax = plt.subplots()
         plt.suptitle(f"{self._algorithm}: N={self._n}, iteration {key[1] + 1} / {self._reps}", y=0.99, fontsize=18)
         plt.title(f"With{'' if self._mem else 'out'} Memory; {'' if self._long else 'Not'} Long", fontsize=10)
-        ns = list(range(1, self._n + 1))
-        traces = self.traces[key]
-        differences = ( [ i for i, (a, b) in enumerate(zip(x, y)) if a != b ] for x, y in zip(traces[:-1], traces[1:]) )
-        for trace, diff in it.zip_longest(traces, differences, fillvalue=[]):
-            colors = [ "tab:orange" if i in diff else "tab:blue" for i in range(self._n) ] 
-            container = ax.bar(ns, [ x + 1 for x in trace ], color=colors)
-            artists.append(container) # TODO Shift y axis a bit to show 0 as well
-        self.anim = animation.ArtistAnimation(fig=fig, artists=artists, interval=self.interval)
+        n = len(traces[0])
+        bars = ax.bar(range(1, n + 1), [ x + 1 for x in traces[0] ], color="tab:blue") # TODO Shift y axis a bit to show 0 as well
+        def update(frame: int) -> list:
+            trace = traces[frame]
+            following = traces[frame + 1] if frame + 1 < len(traces) else trace
+            for k, bar in enumerate(bars):
+                bar.set_height(trace[k] + 1)
+                bar.set_color("tab:orange" if trace[k] != following[k] else "tab:blue") # about to be swapped
+            return list(bars)
+        self.anim = animation.FuncAnimation(fig=self.fig, func=update, frames=len(traces), interval=self.interval, blit=True)
 
     def save(self, path: str) -> None:
         """ Assuming that `path` corresponds to a PillowWriter valid extension (.gif, .apng, .webp) """
         self.anim.save(path, writer="pillow")
 
+    def close(self) -> None:
+        """ Releases the figure of the last animation. """
+        plt.close(self.fig)
+        self.anim = None
+
+_worker_animator: SortingAnimator | None = None
+
+def _init_worker(traces_path: str, interval: int, catalogue_path: str | None) -> None:
+    global _worker_animator
+    plt.switch_backend("Agg")
+    _worker_animator = SortingAnimator(traces_path, interval=interval, catalogue_path=catalogue_path)
+
+def _export(key: tuple[int, int], save_path: str) -> str:
+    _worker_animator.generate(key)
+    _worker_animator.save(save_path)
+    _worker_animator.close()
+    return save_path
+
+def export_all(traces_path: str, animations_path: str, interval: int = 400, ns: list[int] | None = None, extension: str = "gif", workers: int | None = None, force: bool = False, catalogue_path: str | None = None) -> list[str]:
+    """
+    Renders the animations of all tests of a trace file (or just those of `ns`) as `<trace file stem>_<n>_<i>.<extension>` under `animations_path`,
+    in parallel worker processes (each one opening the trace file once); animations newer than the trace file are skipped, unless `force`.
+    Returns the paths of the rendered animations.
+    """
+    stem = os.path.splitext(os.path.basename(traces_path))[0]
+    keys = [ key for key in SortingAnimator(traces_path).keys() if ns is None or key[0] in ns ]
+    jobs = [ (key, os.path.join(animations_path, f"{stem}_{key[0]}_{key[1]}.{extension}")) for key in keys ]
+    jobs = [ (key, path) for key, path in jobs if force or not (os.path.isfile(path) and os.path.getmtime(path) >= os.path.getmtime(traces_path)) ]
+    print(f"{len(jobs)} of {len(keys)} animation(s) to render")
+    if workers == 1:
+        _init_worker(traces_path, interval, catalogue_path)
+        return [ _export(key, path) for key, path in jobs ]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(traces_path, interval, catalogue_path)) as executor:
+        futures = [ executor.submit(_export, key, path) for key, path in jobs ]
+        for done_count, future in enumerate(as_completed(futures), start=1):
+            print(f"[{done_count}/{len(jobs)}] Saved animation at: {future.result()}")
+    return [ path for _, path in jobs ]
+
 def main():
     CWD = os.path.abspath(os.path.dirname(__file__))
     RESULTS_PATH = os.path.join(CWD, "raw_results")
     ANIMATIONS_PATH = os.path.join(CWD, "animations")
     if not os.path.isdir(ANIMATIONS_PATH):
         os.mkdir(ANIMATIONS_PATH)
-    try:
-        input_path = sys.argv[1]
-    except IndexError:
-        raise Exception("Usage: python[3] animate.py <path_to_trace_file>")
-    n = int(input("Enter n: "))
-    i = int(input("Enter i: "))
-    interval = int(int_str) if (int_str := input("Enter interval: ")) != "" else 400
-    key = (n, i)
+    parser = argparse.ArgumentParser(description="Animate a single coaching session from a trace file, or all of them (--all); missing arguments are prompted for.")
+    parser.add_argument("input_path", help="path to the trace file, relative to `raw_results`")
+    parser.add_argument("--n", type=int, help="with --all, only animate the tests of this n")
+    parser.add_argument("--i", type=int)
+    parser.add_argument("--interval", type=int)
+    parser.add_argument("--all", action="store_true", help="render the animations of all tests of the trace file in parallel")
+    parser.add_argument("--workers", type=int, help="with --all, number of animations to render in parallel (all CPUs by default)")
+    parser.add_argument("--format", choices=["gif", "apng", "webp"], default="gif", help="with --all, format of the animations")
+    parser.add_argument("--force", action="store_true", help="with --all, render animations even if they are newer than the trace file")
+    args = parser.parse_args()
+    input_path = args.input_path
     file_path = os.path.join(RESULTS_PATH, input_path)
-    animator = SortingAnimator(file_path, interval=interval)
+    catalogue_path = os.path.join(os.path.dirname(file_path), CATALOGUE_NAME)
+    if args.all:
+        export_all(file_path, ANIMATIONS_PATH, args.interval or 400, None if args.n is None else [args.n], args.format, args.workers, args.force, catalogue_path)
+        return
+    n = args.n if args.n is not None else int(input("Enter n: "))
+    i = args.i if args.i is not None else int(input("Enter i: "))
+    interval = args.interval
+    if interval is None:
+        interval = int(int_str) if (int_str := input("Enter interval: ")) != "" else 400
+    key = (n, i)
+    animator = SortingAnimator(file_path, interval=interval, catalogue_path=catalogue_path)
     print("Generating animation...")
     animator.generate(key)
-    save_path = os.path.join(ANIMATIONS_PATH, input_path[:-6] + "_" + "_".join(map(str, key)) + ".gif")
+    save_path = os.path.join(ANIMATIONS_PATH, os.path.splitext(input_path)[0] + "_" + "_".join(map(str, key)) + ".gif")
     animator.save(save_path)
     print(f"Saved animation at: {save_path}")
 
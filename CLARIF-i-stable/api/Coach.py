@@ -4,6 +4,7 @@ from typing import Callable
 
 from .State import State
 from .Rule import Rule
+from .Metrics import METRICS
 
 from copy import deepcopy
 
@@ -40,6 +41,8 @@ class Coach:
         # print(f"Current state: {current_state}")
         # print("Target rules:","\n".join(map(str, self.target_rules.keys())))
         # print(current_state in self.target_rules)
+        if METRICS.enabled:
+            METRICS.incr("oracle_calls")
         advised_rule = self.target_rules(current_state)
         # print(f"{advised_rule}")
         advised_action = advised_rule.action
@@ -0,0 +1,50 @@
+# api/CompactState.py
+
+from .State import State
+
+class CompactState:
+    """
+    Compact state of the large-n engine: integer keys `0..n-1` index a list of integer values (instead of a `str`-keyed dict).
+    """
+    __slots__ = ("values", )
+
+    def __init__(self, values: list[int]) -> None:
+        self.values: list[int] = values
+
+    def get(self, key: int) -> int:
+        return self.values[key]
+
+    def swap(self, k1: int, k2: int) -> None:
+        values = self.values
+        values[k1], values[k2] = values[k2], values[k1]
+
+    def copy(self) -> "CompactState":
+        return CompactState(self.values.copy())
+
+    def __deepcopy__(self, memo) -> "CompactState":
+        return self.copy()
+
+    def __bool__(self) -> bool:
+        return len(self.values) != 0
+
+    def __iter__(self) -> iter:
+        return enumerate(self.values)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __eq__(self, other: "CompactState") -> bool:
+        if not isinstance(other, CompactState):
+            return False
+        return self.values == other.values
+
+    def __hash__(self) -> int:
+        return hash(tuple(self.values))
+
+    def __str__(self) -> str:
+        return ','.join(f"{k}={v}" for k, v in enumerate(self.values))
+
+    @classmethod
+    def from_state(cls, state: State) -> "CompactState":
+        """ Converts a `State` by indexing its keys in sorted order (e.g., `k00, k01, ...` of sorting test cases). """
+        return cls([ v for _, v in sorted(state.state.items()) ])
@@ -0,0 +1,288 @@
+# api/IndexedLearner.py
+
+"""
+Learner of the large-n engine, over `CompactState`s and `SparseRule`s.
+"""
+
+from heapq import heappush, heappop
+
+from .CompactState import CompactState
+from .SparseRule import SparseRule
+from .Metrics import METRICS
+
+class IndexedLearner:
+    """
+    Same hypothesis semantics as `Learner` (the applicable rule of highest priority fires, ties going to the most recently learned one),
+    restricted to rules conditioned on just the pair of values they swap, which must be inverted, so that a search is a chain of states that cannot cycle.
+
+    Rules are indexed by each `(key, value)` pair of their condition, so that the applicable rules are maintained incrementally
+    along the chain (only rules on the two swapped keys may change). The chain of the last search is kept as linked `ChainState`s along with,
+    per `(key, value)` pair, the intervals of the chain during which it holds; when searching again from the same start state
+    (i.e., within a `TestCase`), the swap of a newly learned rule is spliced in at the first state at which it takes over, if the rest
+    of the chain is unaffected by it (see `_splice`), and the chain is otherwise rolled back to that state.
+
+    Attributes:
+        hypothesis: The learned rules, in learning order
+        version: Number of updates of the hypothesis so far, as `Learner.version`
+    """
+
+    def __init__(self, initial_rules: list[SparseRule] = []) -> None:
+        self.hypothesis: list[SparseRule] = []
+        self.version: int = 0
+        self._trace: list[CompactState] = [] # traces are not kept by the large-n engine
+        self._by_pair: dict[tuple[int, int], list[int]] = {} # (key, value) -> ids (i.e., hypothesis indices) of the rules conditioned on it
+        self._other_pair: dict[tuple[int, int], list[tuple[int, int, int]]] = {} # (key, value) -> (id, key, value) of the other pair of those rules
+        self._conditions: set[tuple[tuple[int, int], ...]] = set()
+        self._start: list[int] | None = None # start (and goal) of the kept chain, if any
+        self._goal: list[int] | None = None
+        self.update_hypothesis(initial_rules)
+
+    def __getstate__(self) -> dict:
+        """ The kept chain is transient, so it is left out when pickling (e.g., for checkpoints). """
+        state = self.__dict__.copy()
+        state["_start"] = None
+        for attr in ("_values", "_first", "_last", "_held", "_applicable", "_heap", "_pending"):
+            state.pop(attr, None)
+        return state
+
+    def update_hypothesis(self, feedback_rules: list[SparseRule]) -> None:
+        self.version += 1
+        for rule in feedback_rules:
+            if rule.condition in self._conditions:
+                continue
+            i, j = sorted(rule.action)
+            condition = dict(rule.condition)
+            if len(condition) != 2 or not (i in condition and j in condition and condition[i] > condition[j]):
+                raise ValueError(f"Rule is not conditioned on (just) an inverted pair of values that it swaps: {rule}")
+            rule_id = len(self.hypothesis)
+            self.hypothesis.append(rule)
+            self._conditions.add(rule.condition)
+            (k1, v1), (k2, v2) = rule.condition
+            self._by_pair.setdefault((k1, v1), []).append(rule_id)
+            self._by_pair.setdefault((k2, v2), []).append(rule_id)
+            self._other_pair.setdefault((k1, v1), []).append((rule_id, k2, v2))
+            self._other_pair.setdefault((k2, v2), []).append((rule_id, k1, v1))
+            if self._start is not None:
+                self._pending.append(rule_id)
+                if rule.applies(CompactState(self._values)):
+                    self._enter(rule_id)
+
+    def search_path(self, start_state: CompactState, goal_state: CompactState) -> tuple[bool, list[tuple[CompactState, None]]]:
+        """
+        Follows the chain of top rules from `start_state` until `goal_state` is reached or no rule applies.
+        Returns `(success, traces)` as `Learner.search_path` does, as far as `Coach` is concerned: `traces` holds the last state of the chain, if any.
+        """
+        if self._start != start_state.values or self._goal != goal_state.values:
+            self._reset(start_state.values, goal_state.values)
+        elif self._pending:
+            takeover = min((self._takeover(rule_id) for rule_id in self._pending), key=ChainState.key)
+            if not (len(self._pending) == 1 and takeover is not self._last and self._splice(takeover, self._pending[0])):
+                self._rollback(takeover)
+        self._pending = []
+        self._extend()
+        success = self._mismatches == 0
+        if not success and self._first is self._last:
+            return False, []
+        return success, [ (CompactState(self._values.copy()), None) ]
+
+    def _reset(self, start: list[int], goal: list[int]) -> None:
+        self._start, self._goal = start.copy(), goal.copy()
+        self._values = start.copy()
+        self._first = self._last = ChainState(0)
+        self._held: dict[tuple[int, int], list[list]] = { (k, v): [[self._first, None]] for k, v in enumerate(start) } # [from, to) chain states
+        self._mismatches: int = sum(1 for v, g in zip(start, goal) if v != g)
+        self._applicable: set[int] = set()
+        self._heap: list[tuple[int, int]] = []
+        self._pending: list[int] = []
+        values = self._values
+        for k, v in enumerate(values):
+            for rule_id, other_key, other_value in self._other_pair.get((k, v), ()):
+                if values[other_key] == other_value and rule_id not in self._applicable:
+                    self._enter(rule_id)
+
+    def _enter(self, rule_id: int) -> None:
+        self._applicable.add(rule_id)
+        heappush(self._heap, (-self.hypothesis[rule_id].priority, -rule_id))
+
+    def _top(self) -> int | None:
+        heap = self._heap
+        while heap and -heap[0][1] not in self._applicable:
+            heappop(heap)
+        return -heap[0][1] if heap else None
+
+    def _outranks(self, rule_id: int, fired: int) -> bool:
+        """ Whether rule `rule_id` would fire instead of rule `fired` (where both apply). """
+        rule, other = self.hypothesis[rule_id], self.hypothesis[fired]
+        return rule.priority > other.priority or (rule.priority == other.priority and rule_id > fired)
+
+    def _swap(self, i: int, j: int) -> None:
+        """ Swaps the values of keys `i` and `j`, updating the applicable rules and the distance to the goal. """
+        values, goal, applicable = self._values, self._goal, self._applicable
+        a, b = values[i], values[j]
+        applicable.difference_update(self._by_pair.get((i, a), ()), self._by_pair.get((j, b), ()))
+        self._mismatches += (b != goal[i]) + (a != goal[j]) - (a != goal[i]) - (b != goal[j])
+        values[i], values[j] = b, a
+        for pair in ((i, b), (j, a)):
+            for rule_id, other_key, other_value in self._other_pair.get(pair, ()):
+                if values[other_key] == other_value and rule_id not in applicable:
+                    self._enter(rule_id)
+
+    def _extend(self) -> None:
+        """ Extends the chain until the goal is reached or no rule applies. """
+        values, held = self._values, self._held
+        while self._mismatches != 0:
+            rule_id = self._top()
+            if rule_id is None:
+                break
+            rule = self.hypothesis[rule_id]
+            if METRICS.enabled:
+                METRICS.incr("states_expanded")
+                METRICS.fire(rule.signature)
+            i, j = rule.action
+            last = self._last
+            state = last.append(rule_id)
+            held[(i, values[i])][-1][1] = state
+            held[(j, values[j])][-1][1] = state
+            self._swap(i, j)
+            held.setdefault((i, values[i]), []).append([state, None])
+            held.setdefault((j, values[j]), []).append([state, None])
+            self._last = state
+
+    def _rollback(self, state: "ChainState") -> None:
+        """ Undoes the swaps of the chain back to its state `state`. """
+        values, held = self._values, self._held
+        while self._last is not state:
+            previous = self._last.previous
+            i, j = self.hypothesis[previous.fired].action
+            held[(i, values[i])].pop()
+            held[(j, values[j])].pop()
+            self._swap(i, j)
+            held[(i, values[i])][-1][1] = None
+            held[(j, values[j])][-1][1] = None
+            previous.truncate()
+            self._last = previous
+
+    def _states(self, spans: list[list]):
+        """ The states of the chain within `[from, to)` spans (`to` being `None` up to the last state), in order. """
+        for lo, hi in sorted(spans, key=lambda span: span[0].label):
+            state = lo
+            while state is not None and state is not hi:
+                yield state
+                state = state.next
+
+    def _spans(self, pairs, lo: "ChainState", hi: "ChainState | None" = None) -> list[list]:
+        """ The `[from, to)` spans of the chain states within `[lo, hi)` at which all `(key, value)` `pairs` hold. """
+        spans = [[lo, hi]]
+        for pair in pairs:
+            spans = [
+                [max(lo, held_lo, key=ChainState.key), min(hi, held_hi, key=ChainState.key)]
+                for lo, hi in spans for held_lo, held_hi in self._held.get(pair, ())
+                if ChainState.key(max(lo, held_lo, key=ChainState.key)) < ChainState.key(min(hi, held_hi, key=ChainState.key))
+            ]
+        return spans
+
+    def _takeover(self, rule_id: int) -> "ChainState":
+        """ The first state of the kept chain at which (newly learned) rule `rule_id` would fire instead, or its last state if none. """
+        for state in self._states(self._spans(self.hypothesis[rule_id].condition, self._first)):
+            if state is self._last or self._outranks(rule_id, state.fired):
+                return state
+        return self._last
+
+    def _splice(self, state: "ChainState", rule_id: int) -> bool:
+        """
+        Inserts the swap of (newly learned) rule `rule_id` at the chain state `state` where it takes over, keeping the rest of the chain,
+        if that is where re-extending the chain would lead; returns whether it did, otherwise the chain is left as it was.
+
+        If the values `a` and `b` that the rule swaps stay put from `state` on, every later state of the new chain is the old one
+        with `a` and `b` exchanged: rules conditioned on neither of them fire just as before, as long as none of the rules that now apply
+        (those conditioned on `b` at the key of `a`, or vice versa) outranks them, and as long as no such state is the goal.
+        """
+        i, j = self.hypothesis[rule_id].action
+        condition = dict(self.hypothesis[rule_id].condition)
+        a, b = condition[i], condition[j]
+        held_a, held_b = self._held[(i, a)][-1], self._held[(j, b)][-1]
+        if held_a[1] is not None or held_b[1] is not None or held_a[0].label > state.label or held_b[0].label > state.label:
+            return False
+        if self._goal[i] == b and self._goal[j] == a:
+            return False
+        for key, value in ((i, b), (j, a)):
+            for other_id, other_key, other_value in self._other_pair.get((key, value), ()):
+                if other_key in (i, j):
+                    continue
+                for other_state in self._states(self._spans(((other_key, other_value), ), state, self._last)):
+                    if self._outranks(other_id, other_state.fired):
+                        return False
+        if METRICS.enabled:
+            METRICS.incr("states_expanded")
+            METRICS.fire(self.hypothesis[rule_id].signature)
+        inserted = state.insert_after(state.fired)
+        state.fired = rule_id
+        held_a[1] = held_b[1] = inserted
+        self._held.setdefault((i, b), []).append([inserted, None])
+        self._held.setdefault((j, a), []).append([inserted, None])
+        self._swap(i, j) # the last state, where `a` and `b` are still at keys `i` and `j`
+        return True
+
+class ChainState:
+    """
+    A state of the chain of an `IndexedLearner`, linked to the next one (if any) by the rule fired from it.
+    States are ordered by their integer `label`s, which are spread apart when a state has to be inserted in between two others
+    (order maintenance), so that splicing a swap into the chain does not renumber the states after it.
+    """
+    __slots__ = ("label", "fired", "previous", "next")
+    SPACING: int = 1 << 32
+
+    def __init__(self, label: int, previous: "ChainState | None" = None) -> None:
+        self.label: int = label
+        self.fired: int | None = None
+        self.previous: "ChainState | None" = previous
+        self.next: "ChainState | None" = None
+
+    @staticmethod
+    def key(state: "ChainState | None") -> float:
+        """ Sort key of a state, `None` standing for past the last state. """
+        return float("inf") if state is None else state.label
+
+    def append(self, fired: int) -> "ChainState":
+        """ The (new) next state of the last state, reached by firing `fired`. """
+        self.fired = fired
+        self.next = ChainState(self.label + self.SPACING, self)
+        return self.next
+
+    def insert_after(self, fired: int) -> "ChainState":
+        """ Inserts a state in between this one and the next, from which `fired` is fired. """
+        following = self.next
+        if following.label - self.label < 2:
+            self._spread()
+            following = self.next
+        state = ChainState((self.label + following.label) // 2, self)
+        state.fired, state.next = fired, following
+        self.next = following.previous = state
+        return state
+
+    def truncate(self) -> None:
+        """ Makes this state the last one. """
+        self.fired = self.next = None
+
+    def _spread(self) -> None:
+        """
+        Spreads the labels of the states following this one evenly, over a window that doubles until they would be far enough apart
+        for a few more insertions in between (or until it reaches the end).
+        """
+        count, end = 1, self.next
+        while True:
+            for _ in range(count):
+                if end is None:
+                    break
+                end = end.next
+            count *= 2
+            window = []
+            state = self.next
+            while state is not end:
+                window.append(state)
+                state = state.next
+            if end is None or (end.label - self.label) // (len(window) + 1) >= max(2, self.SPACING >> 8):
+                break
+        spacing = self.SPACING if end is None else (end.label - self.label) // (len(window) + 1)
+        for k, state in enumerate(window, start=1):
+            state.label = self.label + k * spacing
@@ -10,6 +10,7 @@ from typing import Dict, List, Tuple, Set, Optional
 
 from .Rule import Rule
 from .State import State
+from .Metrics import METRICS
 
 class Learner:
     """
@@ -17,13 +18,21 @@ class Learner:
     
     Attributes:
         hypothesis: List of rules that represent the learner's current understanding
+        version: Number of updates of the hypothesis so far (e.g., to tell whether it has changed since it was last reported)
     """
     
     def __init__(self, initial_rules: List[Rule] = []):
         """Initialize the learner with initial rules."""
         self.hypothesis: list[Rule] = sorted(initial_rules, reverse=True)
+        self.version: int = 0
         self._trace: list[State] = [] # list of traces in the form of States the learner passes through
-    
+
+    def __getstate__(self) -> dict:
+        """ The last search trace is transient, so it is left out when pickling (e.g., for checkpoints). """
+        state = self.__dict__.copy()
+        state["_trace"] = []
+        return state
+
     def search_path(self, start_state: Dict[str, str], goal_state: Dict[str, str]) -> Tuple[bool, List[List[Tuple[State, Optional[Rule]]]]]:
         """
         Search for paths from start state to goal state using current rules.
@@ -60,6 +69,8 @@ class Learner:
                 
             visited.add(current_state)
             self._trace.append(current_state)
+            if METRICS.enabled:
+                METRICS.incr("states_expanded")
             # Check if current state matches goal state
             if current_state == goal_state:
                 if current_state in partial_traces_dict:
@@ -71,6 +82,8 @@ class Learner:
             # Try to apply rules to current state
             top_rule = self._find_top_rule(current_state)
             if top_rule != None:
+                if METRICS.enabled:
+                    METRICS.fire(top_rule.signature)
                 new_state = top_rule.apply(current_state)
                 new_path = path + [(new_state, top_rule)]
                 queue.append((new_state, new_path))
@@ -90,6 +103,9 @@ class Learner:
         return False, traces
    
     def _find_top_rule(self, state: State) -> Rule | None:
+        if METRICS.enabled:
+            METRICS.incr("top_rule_calls")
+            METRICS.incr("rule_checks", len(self.hypothesis)) # `applies` is evaluated for every rule
         try:
             return reduce(lambda x, y: x if x.priority > y.priority else y, filter(lambda r: r.applies(state), self.hypothesis))
         except TypeError:
@@ -122,3 +138,4 @@ class Learner:
                 unique_rules.append(rule)
         # print("unique_rules", unique_rules)
         self.hypothesis = unique_rules
+        self.version += 1
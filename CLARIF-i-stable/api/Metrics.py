@@ -0,0 +1,135 @@
+# api/Metrics.py
+
+"""
+Opt-in instrumentation of coaching sessions.
+"""
+
+import sys
+from time import perf_counter_ns
+from types import ModuleType, FunctionType, BuiltinFunctionType, MethodType
+
+try:
+    import resource
+except ImportError: # e.g., on Windows
+    resource = None
+
+class PhaseTimer:
+    """
+    Accumulates monotonic (nanosecond) wall-clock time per phase, e.g., over all iterations of a `TestCase`.
+
+    Usage: `t = timer.start(); ...; timer.stop("phase", t)`
+    """
+    enabled: bool = True
+
+    def __init__(self) -> None:
+        self.totals: dict[str, int] = {}
+
+    def start(self) -> int:
+        return perf_counter_ns()
+
+    def stop(self, phase: str, start: int) -> None:
+        self.totals[phase] = self.totals.get(phase, 0) + perf_counter_ns() - start
+
+    def add(self, phase: str, ns: int) -> None:
+        """ Adds time measured elsewhere to `phase`. """
+        self.totals[phase] = self.totals.get(phase, 0) + ns
+
+    def get(self, phase: str) -> int:
+        return self.totals.get(phase, 0)
+
+class NullTimer:
+    """ No-op `PhaseTimer`, used whenever timing is disabled. """
+    enabled: bool = False
+    totals: dict[str, int] = {}
+
+    def start(self) -> int:
+        return 0
+
+    def stop(self, phase: str, start: int) -> None:
+        pass
+
+    def add(self, phase: str, ns: int) -> None:
+        pass
+
+    def get(self, phase: str) -> int:
+        return 0
+
+NULL_TIMER = NullTimer()
+
+class MetricsRegistry:
+    """
+    Deterministic operation counters (states expanded, rule checks, oracle calls, etc.) along with per-rule firing counts,
+    keyed by rule signature (`Rule.signature`), as names only tell actions apart.
+    Instrumented code checks `enabled` before counting, so a disabled registry costs a single attribute lookup.
+    """
+
+    def __init__(self) -> None:
+        self.enabled: bool = False
+        self.counts: dict[str, int] = {}
+        self.rule_firings: dict[str, int] = {}
+
+    def incr(self, name: str, k: int = 1) -> None:
+        self.counts[name] = self.counts.get(name, 0) + k
+
+    def fire(self, rule_signature: str) -> None:
+        self.rule_firings[rule_signature] = self.rule_firings.get(rule_signature, 0) + 1
+
+    def reset(self) -> None:
+        self.counts = {}
+        self.rule_firings = {}
+
+    def snapshot(self) -> dict:
+        return { "counts": dict(self.counts), "rule_firings": dict(self.rule_firings) }
+
+METRICS = MetricsRegistry()
+
+def deep_sizeof(obj: object) -> int:
+    """
+    Size (bytes) of `obj` along with everything reachable from it through containers and instance attributes (or slots), each object counted once.
+    Classes, modules and functions (e.g., the oracle closures of actions) are not followed.
+    """
+    seen = set()
+    size = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, (type, ModuleType, FunctionType, BuiltinFunctionType, MethodType)):
+            continue
+        seen.add(id(o))
+        size += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        if hasattr(o, "__dict__"):
+            stack.append(o.__dict__)
+        for slot in getattr(type(o), "__slots__", ()):
+            stack.append(getattr(o, slot, None))
+    return size
+
+def reset_peak_rss() -> bool:
+    """ Resets the peak resident set size of the process to its current one, where possible (through `/proc`, i.e., on Linux); returns whether it did. """
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+        return True
+    except OSError:
+        return False
+
+def peak_rss() -> int:
+    """
+    Peak resident set size (bytes) of the process since the last `reset_peak_rss` (`VmHWM`, on Linux), or, elsewhere,
+    since the process started (`ru_maxrss`, which cannot be reset); -1 where unavailable.
+    """
+    try:
+        with open("/proc/self/status", "rb") as file:
+            for line in file:
+                if line.startswith(b"VmHWM:"):
+                    return int(line.split()[1]) * 1024 # kB
+    except OSError:
+        pass
+    if resource is None:
+        return -1
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024 # kilobytes, except on macOS
@@ -32,6 +32,12 @@ class Rule:
             return False
         return self.__key() == other.__key()
 
+    @property
+    def signature(self) -> str:
+        """ The rule's body and head, which identify it across hypotheses and tests (unlike its name, which only tells its action). """
+        condition = self.condition.name if self._relational else self.condition
+        return f"IF {condition} THEN {self.action}"
+
     def __str__(self):
         return f"{self.name}: IF {self.condition} THEN {self.action} (priority: {self.priority})"
 
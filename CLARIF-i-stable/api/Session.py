@@ -0,0 +1,118 @@
+# api/Session.py
+
+"""
+Asynchronous coaching sessions: the learner of a `TestCase` (see `TestCase.session`) and its coach exchange messages through awaitables,
+so that a single event loop multiplexes many sessions, coached by simulated coaches (whose oracles may run in an executor)
+or by humans (e.g., through a GUI or a web app) alike, without a thread per session.
+"""
+
+import asyncio
+from abc import ABC, abstractmethod
+from concurrent.futures import Executor
+from typing import Iterable
+
+from .Rule import Rule
+from .TestCase import TestCase
+
+class Query:
+    """
+    A learner's request for advice on its `traces` (from `test.start_state` towards `test.goal_state`), answered with `(success, rules)`,
+    as returned by `Coach.evaluate_inference`.
+
+    Attributes:
+        session_id: The id of the session, as given to `run_session`
+        step: The coaching step of the session, i.e., the number of times the learner has been advised so far
+    """
+
+    def __init__(self, test: TestCase, traces: list, session_id: object = None) -> None:
+        self.test: TestCase = test
+        self.traces: list = traces
+        self.session_id: object = session_id
+        self.step: int = test._steps
+        self._future: asyncio.Future | None = None # set by coaches that wait for an answer, e.g., `ChannelCoach`
+
+    def reply(self, advice: tuple[bool, list[Rule]]) -> None:
+        """ Answers the query; from the event loop's thread only. """
+        self.__check_awaited()
+        if not self._future.done():
+            self._future.set_result(advice)
+
+    def reply_threadsafe(self, advice: tuple[bool, list[Rule]]) -> None:
+        """ Answers the query from any thread (e.g., that of a GUI). """
+        self.__check_awaited()
+        self._future.get_loop().call_soon_threadsafe(self.reply, advice)
+
+    def __check_awaited(self) -> None:
+        if self._future is None:
+            raise RuntimeError(f"Query of session {self.session_id} (step {self.step}) is not awaiting a reply: its coach answers it directly")
+
+class AsyncCoach(ABC):
+    """ Coach of asynchronous sessions. """
+
+    @abstractmethod
+    async def advise(self, query: Query) -> tuple[bool, list[Rule]]:
+        """ Advice on the query, as returned by `Coach.evaluate_inference`. """
+
+class SimulatedCoach(AsyncCoach):
+    """
+    Answers with the test's own `coach` (i.e., its oracle): inline, yielding to other sessions after each answer, or, if `executor` is set,
+    in it. Oracles and their arguments must be picklable for a `ProcessPoolExecutor`, which only pays off for expensive (e.g., full-state) oracles.
+    """
+
+    def __init__(self, executor: Executor | None = None) -> None:
+        self.executor: Executor | None = executor
+
+    async def advise(self, query: Query) -> tuple[bool, list[Rule]]:
+        test = query.test
+        if self.executor is not None:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, test.coach.evaluate_inference, test.start_state, test.goal_state, query.traces)
+        advice = test.coach.evaluate_inference(test.start_state, test.goal_state, query.traces)
+        await asyncio.sleep(0)
+        return advice
+
+class ChannelCoach(AsyncCoach):
+    """
+    Forwards queries to a front end (e.g., a human coaching through a GUI or a web app), which takes them from `queries`
+    and answers them through `Query.reply` (or `Query.reply_threadsafe`, if it runs on another thread; it can then take queries
+    through `asyncio.run_coroutine_threadsafe(coach.queries.get(), loop)`). Sessions wait for their answer without blocking the loop.
+    """
+
+    def __init__(self, maxsize: int = 0) -> None:
+        self.queries: asyncio.Queue = asyncio.Queue(maxsize)
+
+    async def advise(self, query: Query) -> tuple[bool, list[Rule]]:
+        query._future = asyncio.get_running_loop().create_future()
+        await self.queries.put(query)
+        return await query._future
+
+async def run_session(test: TestCase, coach: AsyncCoach, session_id: object = None) -> TestCase:
+    """ Runs the coaching session of `test`, as `TestCase.run` does, with `coach` answering asynchronously; returns `test`. """
+    timer = test.timer
+    session = test.session()
+    traces = next(session)
+    try:
+        while True:
+            t = timer.start()
+            advice = await coach.advise(Query(test, traces, session_id))
+            timer.stop("oracle", t)
+            traces = session.send(advice)
+    except StopIteration:
+        return test
+
+async def run_sessions(tests: Iterable[TestCase], coach: AsyncCoach, concurrency: int | None = None) -> list[TestCase]:
+    """
+    Runs the sessions of `tests` concurrently (at most `concurrency` of them at a time, all by default), their ids being their indices;
+    the first failing session cancels the others. Sessions that share a learner learn from each other, as advice comes.
+    """
+    semaphore = asyncio.Semaphore(concurrency) if concurrency is not None else None
+    async def bounded(test: TestCase, session_id: int) -> TestCase:
+        if semaphore is None:
+            return await run_session(test, coach, session_id)
+        async with semaphore:
+            return await run_session(test, coach, session_id)
+    tasks = [ asyncio.ensure_future(bounded(test, session_id)) for session_id, test in enumerate(tests) ]
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
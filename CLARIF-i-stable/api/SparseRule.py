@@ -0,0 +1,56 @@
+# api/SparseRule.py
+
+from .CompactState import CompactState
+
+class SparseRule:
+    """
+    Partial-state swap rule of the large-n engine: IF `state[key] == value` for every `(key, value)` in `condition` THEN swap the two keys of `action`.
+    An empty `action` stands for no action. Rules are immutable, hence shared instead of copied.
+    """
+    __slots__ = ("condition", "action", "priority")
+
+    def __init__(self, condition: tuple[tuple[int, int], ...], action: tuple[int, int] | tuple[()], priority: int = 1) -> None:
+        self.condition: tuple[tuple[int, int], ...] = condition
+        self.action: tuple[int, int] | tuple[()] = action
+        self.priority: int = priority
+
+    @property
+    def name(self) -> str:
+        return f"R(swap({self.action[0]}, {self.action[1]}))" if self.action else "R(No action)"
+
+    @property
+    def signature(self) -> str:
+        """ The rule's body and head, which identify it across hypotheses and tests (unlike its name, which only tells its action). """
+        condition = ','.join(f"{k}={v}" for k, v in self.condition)
+        action = f"swap({self.action[0]}, {self.action[1]})" if self.action else "No action"
+        return f"IF {condition} THEN {action}"
+
+    def applies(self, state: CompactState) -> bool:
+        values = state.values
+        return all(values[k] == v for k, v in self.condition)
+
+    def apply(self, state: CompactState) -> CompactState:
+        new_state = state.copy()
+        if self.action:
+            new_state.swap(*self.action)
+        return new_state
+
+    def __deepcopy__(self, memo) -> "SparseRule":
+        return self
+
+    def __hash__(self) -> int:
+        return hash((self.condition, self.action))
+
+    def __eq__(self, other: "SparseRule") -> bool:
+        if not isinstance(other, SparseRule):
+            return False
+        return self.condition == other.condition and self.action == other.action
+
+    def __lt__(self, other: "SparseRule") -> bool:
+        return self.priority < other.priority
+
+    def __str__(self) -> str:
+        return f"{self.name}: {self.signature} (priority: {self.priority})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
@@ -2,6 +2,8 @@
 
 from typing import Any
 
+from .Metrics import METRICS
+
 class State:
     def __init__(self, state: dict[str, Any] = dict()) -> None:
         self.state: dict[str, Any] = state
@@ -29,6 +31,8 @@ class State:
         return iter(self.state.items()) # FIXME Maybe `iter()` is not needed here
 
     def __deepcopy__(self, memo) -> "State":
+        if METRICS.enabled:
+            METRICS.incr("deepcopies")
         copycat: "State" = State(self.state.copy())
         return copycat
 
@@ -1,12 +1,15 @@
 # api/TestCase
 
+import time
 from copy import deepcopy
 
 from .State import State
 from .Learner import Learner
 from .Coach import Coach
 from .Rule import Rule
-from typing import Callable
+from .Metrics import PhaseTimer, NullTimer, NULL_TIMER
+from .TraceRetention import TraceRetention
+from typing import Callable, Generator
 
 class TestCase:
     def __init__(self, start_state: State, goal_state: State, target_rules: Callable[[State], Rule], learner: Learner | None=None, full_reporting: bool = True, report_traces: bool = False) -> None:
@@ -19,22 +22,61 @@ class TestCase:
         self.full_reporting: bool = full_reporting
         self._steps: int = 0
         self.report_traces: bool = self.full_reporting or report_traces
-        self._learner_traces: list[list[State]] = []
+        self.traces: TraceRetention = TraceRetention("all" if self.report_traces else "none") # replace to keep less of the traces, or to stream them
+        self.timer: PhaseTimer | NullTimer = NULL_TIMER # replace with a `PhaseTimer` to time the "search", "oracle" and "update" phases
+        self.max_steps: int | None = None # coaching steps after which `run` gives up, raising a `TimeoutError`
+        self.timeout: float | None = None # same, in (wall-clock) seconds; checked in between coaching steps
 
     def run(self) -> None:
+        """ Runs the coaching session, with the test's own `coach` answering inline (see `api.Session` for asynchronous coaches). """
+        timer = self.timer
+        session = self.session()
+        traces = next(session)
+        try:
+            while True:
+                t = timer.start()
+                advice = self.coach.evaluate_inference(self.start_state, self.goal_state, traces)
+                timer.stop("oracle", t)
+                traces = session.send(advice)
+        except StopIteration:
+            pass
+
+    def session(self) -> Generator[list, tuple[bool, list[Rule]], None]:
+        """
+        The learner's side of the coaching session, as a generator: yields the traces of each search of the learner, and is sent the coach's advice
+        on them (as returned by `Coach.evaluate_inference`), until the coach approves. Whoever drives it (see `run`) provides the coach.
+        """
+        timer = self.timer
+        deadline = None if self.timeout is None else time.perf_counter() + self.timeout
+        t = timer.start()
         path = self.learner.search_path(self.start_state, self.goal_state)
-        if self.report_traces:
-            self._learner_traces.append(self.learner._trace)
+        timer.stop("search", t)
+        self.__keep_trace()
         previous_advice = None
-        while (advice := self.coach.evaluate_inference(self.start_state, self.goal_state, path[1])) != ( True, [] ):
+        advice = yield path[1]
+        while advice != ( True, [] ):
             if previous_advice != None and all((x == y for x, y in zip(previous_advice, advice[1]))):
                 raise ValueError(f"Duplicate advice:\n\t{advice}")
+            if self.max_steps is not None and self._steps >= self.max_steps:
+                raise TimeoutError(f"Step limit of {self.max_steps} reached")
+            if deadline is not None and time.perf_counter() > deadline:
+                raise TimeoutError(f"Timeout of {self.timeout}s reached after {self._steps} steps")
+            t = timer.start()
             self.learner.update_hypothesis(advice[1])
+            timer.stop("update", t)
+            t = timer.start()
             path = self.learner.search_path(self.start_state, self.goal_state)
-            if self.report_traces:
-                self._learner_traces.append(self.learner._trace)
+            timer.stop("search", t)
+            self.__keep_trace()
             previous_advice = deepcopy(advice[1])
             self._steps += 1
+            advice = yield path[1]
+
+    def __keep_trace(self) -> None:
+        if self.traces.mode != "none":
+            t = self.timer.start()
+            self.traces.add(self.learner._trace)
+            self.timer.stop("io", t)
 
     def report(self) -> dict:
         return {
@@ -45,7 +87,7 @@ class TestCase:
         }
 
     def get_traces_str(self) -> str:
-        return "\n".join(("; ".join(str(s) for s in t) for t in self._learner_traces))
+        return str(self.traces)
 
     def __str__(self) -> str:
         if self.full_reporting:
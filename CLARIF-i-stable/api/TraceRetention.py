@@ -0,0 +1,46 @@
+# api/TraceRetention.py
+
+from collections import deque
+
+from .State import State
+
+class TraceRetention:
+    """
+    What a `TestCase` keeps of the learner's traces, i.e., of the states the learner passes through in each coaching iteration:
+        "all":      every iteration
+        "last":     only the last iteration (all that `animate.py` uses)
+        "ring":     the last `size` iterations
+        "none":     nothing
+        "stream":   nothing either; each iteration is passed to `sink.write_iteration` (e.g., a `traces` writer) as soon as it is complete
+    Iterations are kept as lists of values (in sorted key order, the keys being kept once), never as `State`s.
+
+    Attributes:
+        keys: The sorted keys of the states, once an iteration has been kept
+        iterations: The kept iterations, as lists of states (value lists)
+    """
+    MODES = ("all", "last", "ring", "none", "stream")
+
+    def __init__(self, mode: str = "all", size: int = 1, sink=None) -> None:
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown trace retention mode `{mode}`; expected one of {', '.join(self.MODES)}")
+        if mode == "stream" and sink is None:
+            raise ValueError("Streamed traces require a sink")
+        self.mode: str = mode
+        self.sink = sink
+        self.keys: list[str] | None = None
+        self.iterations: list[list[list[int]]] | deque = deque(maxlen=1 if mode == "last" else size) if mode in ("last", "ring") else []
+
+    def add(self, states: list[State]) -> None:
+        """ Keeps (or streams) an iteration, given as the states of the learner's last search. """
+        if self.mode == "none":
+            return
+        if self.mode == "stream":
+            self.sink.write_iteration(states)
+            return
+        if self.keys is None and states:
+            self.keys = sorted(states[0].state.keys())
+        self.iterations.append([ [ v for _, v in sorted(s.state.items()) ] for s in states ])
+
+    def __str__(self) -> str:
+        """ The kept iterations, one per line, as in `.trace` files. """
+        return "\n".join("; ".join(",".join(f"{k}={v}" for k, v in zip(self.keys, values)) for values in states) for states in self.iterations)
@@ -0,0 +1,225 @@
+# bench.py
+
+"""
+Benchmark suite of the coaching engine, with JSON baselines:
+- micro: `State` hashing and comparisons, `Rule.applies`/`apply`, `Learner._find_top_rule` and the oracles of `utils.py`
+- macro: a full `TestCase.run` per algorithm, `n` and memory mode (after a few untimed warm-up tests, with memory)
+- large: a full `TestCase.run` of the large-n engine (`main.COMPACT_ALGORITHMS`), at n = 100, 500, 1000
+  for `bp` and `qp`
+
+Usage:
+    python bench.py run [--micro | --macro | --large] [--filter SUBSTRING] [--sizes 5 10 ...] [-o benchmarks/<name>.json]
+    python bench.py compare <baseline.json> <current.json> [--threshold 0.1]
+
+Benchmarks are compared by their median times. Note that macro benchmarks of full-state algorithms (`b`, `q`) take minutes at n = 40.
+The work of a test (steps and counters) does not depend on string hashing, but `State` hashes (hence set and dict layouts) do,
+so comparing baselines run under different `PYTHONHASHSEED`s is allowed, with a warning.
+"""
+
+import os
+import sys
+import json
+import time
+import timeit
+import random
+import argparse
+import platform
+import statistics
+from copy import deepcopy
+from typing import Callable
+
+from main import ALGORITHMS, COMPACT_ALGORITHMS
+from utils import SwapCallback, sorting_keys, find_bubble_swap_action, find_quick_swap_action, find_bubble_partial_swap_action, find_quick_partial_swap_action
+from api.Learner import Learner
+from api.IndexedLearner import IndexedLearner
+from api.Rule import Rule
+from api.Action import Action
+from api.State import State
+
+CWD = os.path.abspath(os.path.dirname(__file__))
+BENCHMARKS_PATH = os.path.join(CWD, "benchmarks")
+
+ORACLES = {
+    'b': find_bubble_swap_action,
+    'q': find_quick_swap_action,
+    'bp': find_bubble_partial_swap_action,
+    'qp': find_quick_partial_swap_action,
+}
+MICRO_SIZES = (10, 40)
+HYPOTHESIS_SIZES = (10, 100, 1000)
+MACRO_SIZES = (5, 10, 20, 40)
+LARGE_SIZES = { "bp": (100, 500, 1000), "qp": (100, 500, 1000) }
+REPEAT = 5 # default timings per benchmark, of all suites
+
+def random_state(n: int, rng: random.Random) -> State:
+    values = list(range(n))
+    rng.shuffle(values)
+    return State(dict(zip(sorting_keys(n), values)))
+
+def random_hypothesis(n: int, size: int, rng: random.Random) -> list[Rule]:
+    """ `size` distinct partial (adjacent pair) rules over `n` keys, as learned with `bp`. """
+    keys = sorting_keys(n)
+    conditions = set()
+    while len(conditions) < size:
+        i = rng.randrange(n - 1)
+        conditions.add((i, *rng.sample(range(n), 2)))
+    rules = [
+        Rule(f"R{j}", State({ keys[i]: a, keys[i + 1]: b }), Action(SwapCallback(keys[i], keys[i + 1]), f"swap({keys[i]}, {keys[i + 1]})"), priority=n - i)
+        for j, (i, a, b) in enumerate(sorted(conditions))
+    ]
+    return sorted(rules, reverse=True)
+
+def micro_benchmarks() -> dict[str, Callable[[], object]]:
+    rng = random.Random(0)
+    benchmarks = {}
+    for n in MICRO_SIZES:
+        keys = sorting_keys(n)
+        state = random_state(n, rng)
+        same_state = deepcopy(state)
+        partial_state = State({ keys[0]: state.get(keys[0]), keys[1]: state.get(keys[1]) })
+        partial_rule = Rule("R", partial_state, Action(SwapCallback(keys[0], keys[1]), "swap"))
+        full_rule = Rule("R", same_state, Action(SwapCallback(keys[0], keys[1]), "swap"))
+        benchmarks[f"state_hash_n{n}"] = lambda state=state: hash(state)
+        benchmarks[f"state_eq_n{n}"] = lambda state=state, other=same_state: state == other
+        benchmarks[f"state_le_partial_n{n}"] = lambda state=state, partial_state=partial_state: partial_state <= state
+        benchmarks[f"state_le_full_n{n}"] = lambda state=state, other=same_state: other <= state
+        benchmarks[f"rule_applies_partial_n{n}"] = lambda state=state, rule=partial_rule: rule.applies(state)
+        benchmarks[f"rule_applies_full_n{n}"] = lambda state=state, rule=full_rule: rule.applies(state)
+        benchmarks[f"rule_apply_n{n}"] = lambda state=state, rule=partial_rule: rule.apply(state)
+        for algorithm, oracle in ORACLES.items():
+            benchmarks[f"oracle_{algorithm}_n{n}"] = lambda state=state, keys=keys, oracle=oracle: oracle(state, keys)
+    n = max(MICRO_SIZES)
+    for size in HYPOTHESIS_SIZES:
+        learner = Learner(random_hypothesis(n, size, rng))
+        benchmarks[f"find_top_rule_h{size}"] = lambda state=random_state(n, rng), learner=learner: learner._find_top_rule(state)
+    return benchmarks
+
+def time_micro(fn: Callable[[], object], repeat: int) -> list[float]:
+    """ Per-call times (ns) of `repeat` batches, each batch being long enough (>= 0.2s) for the timer's resolution. """
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return [ t / number * 1e9 for t in timer.repeat(repeat, number) ]
+
+def test_factory(generate: Callable, n: int, memory: str, warmup: int, learner_class: type = Learner) -> Callable[[], object]:
+    """ Returns a factory of the same test case on every call: seeded alike, and, if with memory, with (a copy of) the same warmed-up learner. """
+    warm = {}
+    def make_test():
+        random.seed(0)
+        if memory == "n":
+            return generate(n, None, False, False)
+        if not warm:
+            warm["learner"] = learner_class()
+            for _ in range(warmup):
+                generate(n, warm["learner"], False, False).run()
+            warm["rng_state"] = random.getstate()
+        random.setstate(warm["rng_state"])
+        return generate(n, deepcopy(warm["learner"]), False, False)
+    return make_test
+
+def macro_benchmarks(sizes: tuple[int, ...] = MACRO_SIZES, warmup: int = 2, algorithms: dict[str, Callable] = ALGORITHMS, prefix: str = "testcase", learner_class: type = Learner) -> dict[str, Callable[[], object]]:
+    return {
+        f"{prefix}_{algorithm}_n{n}_mem{memory}": test_factory(generate, n, memory, warmup, learner_class)
+        for algorithm, generate in algorithms.items() for n in sizes for memory in ("n", "y")
+    }
+
+def large_benchmarks(warmup: int = 2) -> dict[str, Callable[[], object]]:
+    benchmarks = {}
+    for algorithm, sizes in LARGE_SIZES.items():
+        benchmarks |= macro_benchmarks(sizes, warmup, { algorithm: COMPACT_ALGORITHMS[algorithm] }, "compact", IndexedLearner)
+    return benchmarks
+
+def time_macro(make_test: Callable[[], object], repeat: int) -> list[float]:
+    times = []
+    for _ in range(repeat):
+        test = make_test()
+        start = time.perf_counter_ns()
+        test.run()
+        times.append(time.perf_counter_ns() - start)
+    return times
+
+def run(micro: bool, macro: bool, large: bool, name_filter: str, sizes: tuple[int, ...], repeat: int | None, out_path: str) -> dict:
+    suites = []
+    if micro:
+        suites.append(("micro", micro_benchmarks(), time_micro, repeat or REPEAT))
+    if macro:
+        suites.append(("macro", macro_benchmarks(sizes), time_macro, repeat or REPEAT))
+    if large:
+        suites.append(("large", large_benchmarks(), time_macro, repeat or REPEAT))
+    results = {}
+    for kind, benchmarks, time_fn, suite_repeat in suites:
+        for name, fn in benchmarks.items():
+            if name_filter not in name:
+                continue
+            times = time_fn(fn, suite_repeat)
+            results[name] = { "kind": kind, "best_ns": min(times), "median_ns": statistics.median(times), "times_ns": times }
+            print(f"{name:<32} {statistics.median(times):>16,.0f} ns")
+    baseline = {
+        "meta": {
+            "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": sys.version.split()[0],
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+            "pythonhashseed": os.environ.get("PYTHONHASHSEED"),
+        },
+        "benchmarks": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    with open(out_path, "w") as file:
+        json.dump(baseline, file, indent=2)
+    print(f"\nSaved benchmarks at: {out_path}")
+    return baseline
+
+def compare(baseline_path: str, current_path: str, threshold: float = 0.1) -> bool:
+    """
+    Prints the median-time ratios of the benchmarks in both files; returns whether any ratio exceeds `1 + threshold`.
+    Warns if the files were run under different `PYTHONHASHSEED`s.
+    """
+    with open(baseline_path, "r") as file:
+        baseline_file = json.load(file)
+    with open(current_path, "r") as file:
+        current_file = json.load(file)
+    baseline_seed, current_seed = baseline_file["meta"].get("pythonhashseed"), current_file["meta"].get("pythonhashseed")
+    if baseline_seed != current_seed:
+        print(f"Warning: comparing benchmarks run with PYTHONHASHSEED={baseline_seed} ({baseline_path}) and PYTHONHASHSEED={current_seed} ({current_path})\n", file=sys.stderr)
+    baseline, current = baseline_file["benchmarks"], current_file["benchmarks"]
+    regressed = False
+    print(f"{'benchmark':<32} {'baseline (ns)':>16} {'current (ns)':>16} {'ratio':>8}")
+    for name in sorted(baseline.keys() & current.keys()):
+        ratio = current[name]["median_ns"] / baseline[name]["median_ns"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "REGRESSION"
+            regressed = True
+        elif ratio < 1 / (1 + threshold):
+            flag = "improved"
+        print(f"{name:<32} {baseline[name]['median_ns']:>16,.0f} {current[name]['median_ns']:>16,.0f} {ratio:>8.3f} {flag}")
+    for name in sorted(baseline.keys() ^ current.keys()):
+        print(f"{name:<32} only in {'baseline' if name in baseline else 'current'}")
+    return regressed
+
+def main():
+    parser = argparse.ArgumentParser(description="Run micro/macro benchmarks into JSON baselines, or compare two baselines.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="run benchmarks and save them as a JSON baseline")
+    suite = run_parser.add_mutually_exclusive_group()
+    suite.add_argument("--micro", action="store_true", help="run micro benchmarks only")
+    suite.add_argument("--macro", action="store_true", help="run macro benchmarks only")
+    suite.add_argument("--large", action="store_true", help="run large-n benchmarks only")
+    run_parser.add_argument("--filter", default="", help="run only the benchmarks whose name contains FILTER")
+    run_parser.add_argument("--sizes", type=int, nargs="+", default=list(MACRO_SIZES), help="values of `n` of macro benchmarks")
+    run_parser.add_argument("--repeat", type=int, help=f"timings per benchmark (default: {REPEAT})")
+    run_parser.add_argument("-o", "--out", default=os.path.join(BENCHMARKS_PATH, f"{time.strftime('%Y%m%d-%H%M%S')}.json"))
+    compare_parser = subparsers.add_parser("compare", help="flag regressions of a JSON baseline against another")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="relative slowdown to flag (default: 0.1, i.e., 10%%)")
+    args = parser.parse_args()
+    if args.command == "run":
+        run_all = not (args.micro or args.macro or args.large)
+        run(run_all or args.micro, run_all or args.macro, args.large, args.filter, tuple(args.sizes), args.repeat, args.out)
+    elif compare(args.baseline, args.current, args.threshold):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+# catalogue.py
+
+"""
+SQLite catalogue of results: one `sweeps` row per sweep, with its typed parameters, and one `tests` row per test, with its seed, steps,
+timings, counters, etc. (`NULL` where not recorded). Tests are indexed on `(algorithm, n, mem, long)`, so that plotting across many sweeps
+is a single query, without globbing or parsing filenames. Sweeps run by `main.py` are inserted as they go, into `<results path>/catalogue.sqlite`;
+results files written before that (or elsewhere) can be imported, which is the only place where parameters are parsed from filenames.
+
+Usage: python catalogue.py import|list|remove [<results path>] [--catalogue PATH] [--names NAME ...]
+"""
+
+import os
+import re
+import json
+import sqlite3
+import argparse
+
+from results import RESULT_FIELDS, TIMING_FIELDS, COUNTER_FIELDS, MEMORY_FIELDS, load_results
+
+CWD = os.path.abspath(os.path.dirname(__file__))
+RESULTS_PATH = os.path.join(CWD, "raw_results")
+CATALOGUE_NAME = "catalogue.sqlite"
+
+SQL_TYPES = { int: "INTEGER", float: "REAL", str: "TEXT" }
+TEST_FIELDS: dict[str, type] = RESULT_FIELDS | TIMING_FIELDS | COUNTER_FIELDS | MEMORY_FIELDS
+TEST_COLUMNS: list[str] = [ "sweep_id", "mem", "long" ] + list(TEST_FIELDS.keys())
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS sweeps (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    algorithm TEXT NOT NULL,
+    N INTEGER NOT NULL,
+    reps INTEGER NOT NULL,
+    mem INTEGER NOT NULL,
+    long INTEGER NOT NULL,
+    full_reporting INTEGER,
+    report_traces INTEGER,
+    seed INTEGER,
+    compact INTEGER,
+    corpus TEXT,
+    result_file TEXT,
+    trace_file TEXT,
+    config TEXT
+);
+CREATE TABLE IF NOT EXISTS tests (
+    sweep_id INTEGER NOT NULL REFERENCES sweeps(id) ON DELETE CASCADE,
+    mem INTEGER NOT NULL,
+    long INTEGER NOT NULL,
+    {", ".join(f"{name} {SQL_TYPES[t]}" for name, t in TEST_FIELDS.items())},
+    PRIMARY KEY (sweep_id, n, rep)
+);
+CREATE INDEX IF NOT EXISTS tests_cell ON tests (algorithm, n, mem, long);
+CREATE INDEX IF NOT EXISTS sweeps_trace_file ON sweeps (trace_file);
+"""
+
+ALGORITHMS = ("bp", "qp", "b", "q") # those of `main.ALGORITHMS` (which cannot be imported here, as `main` imports this module)
+# `{algorithm}_test_N{N}_reps{reps}[_mem{y|n}][_long{y|n}][_seed{seed}][_corpus{stem}][_compact]...`, see `main.sweep_name`
+SWEEP_NAME = re.compile(
+    rf"^(?P<algorithm>{'|'.join(ALGORITHMS)})_test_N(?P<N>\d+)_reps(?P<reps>\d+)(?:_mem(?P<memory>[yn]))?(?:_long(?P<long_memory>[yn]))?"
+    r"(?:_seed(?P<seed>\d+))?(?:_corpus(?P<corpus>[^_]+))?(?P<compact>_compact)?(?:_.*)?$"
+)
+
+def parse_sweep_name(name: str) -> dict:
+    """ Sweep parameters encoded in a (legacy) results filename stem; missing memory flags mean no memory. """
+    match = SWEEP_NAME.match(name)
+    if match is None:
+        raise ValueError(f"Not a sweep name: {name}")
+    return {
+        "algorithm": match["algorithm"],
+        "N": int(match["N"]),
+        "reps": int(match["reps"]),
+        "memory": match["memory"] or "n",
+        "long_memory": match["long_memory"] or "n",
+        "seed": None if match["seed"] is None else int(match["seed"]),
+        "corpus": match["corpus"],
+        "compact": match["compact"] is not None,
+    }
+
+class Catalogue:
+    """ Connection to a results catalogue, created if missing. Safe to share between processes (e.g., parallel sweeps of `scheduler.py`). """
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        self._connection = sqlite3.connect(path, timeout=60)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA foreign_keys=ON")
+        self._connection.executescript(SCHEMA)
+
+    def add_sweep(self, name: str, config: dict, result_file: str | None = None, trace_file: str | None = None, fresh: bool = True) -> int:
+        """
+        Registers sweep `name` (files are given relative to the catalogue's directory) and returns its id.
+        A `fresh` sweep replaces any tests previously recorded under the same name, while a resumed one keeps them.
+        """
+        row = (
+            config["algorithm"], config["N"], config["reps"], config["memory"] == "y", config["long_memory"] == "y",
+            config.get("full_reporting"), config.get("report_traces"), config.get("seed"), config.get("compact", False), config.get("corpus"),
+            result_file, trace_file, json.dumps(config), name,
+        )
+        with self._connection:
+            cursor = self._connection.execute(
+                "UPDATE sweeps SET algorithm = ?, N = ?, reps = ?, mem = ?, long = ?, full_reporting = ?, report_traces = ?, seed = ?, compact = ?, corpus = ?, "
+                "result_file = ?, trace_file = ?, config = ? WHERE name = ? RETURNING id", row
+            )
+            found = cursor.fetchone()
+            if found is None:
+                cursor = self._connection.execute(
+                    "INSERT INTO sweeps (algorithm, N, reps, mem, long, full_reporting, report_traces, seed, compact, corpus, result_file, trace_file, config, name) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row
+                )
+                return cursor.lastrowid
+            if fresh:
+                self._connection.execute("DELETE FROM tests WHERE sweep_id = ?", (found[0], ))
+            return found[0]
+
+    def add_tests(self, sweep_id: int, records: list[dict]) -> None:
+        """ Bulk-inserts the records (see `results.make_record`) of a sweep, in one transaction; re-run tests replace their previous rows. """
+        mem, long = self._connection.execute("SELECT mem, long FROM sweeps WHERE id = ?", (sweep_id, )).fetchone()
+        rows = [ (sweep_id, mem, long) + tuple(record.get(name) for name in TEST_FIELDS) for record in records ]
+        with self._connection:
+            self._connection.executemany(f"INSERT OR REPLACE INTO tests ({', '.join(TEST_COLUMNS)}) VALUES ({', '.join('?' * len(TEST_COLUMNS))})", rows)
+
+    def remove_sweep(self, name: str) -> None:
+        with self._connection:
+            self._connection.execute("DELETE FROM sweeps WHERE name = ?", (name, ))
+
+    def sweeps(self, **where) -> list[dict]:
+        """ Sweeps (as dicts of their columns) whose columns equal the given values, e.g., `sweeps(trace_file="...")`. """
+        clause = " AND ".join(f"{column} = ?" for column in where) or "1"
+        cursor = self._connection.execute(f"SELECT * FROM sweeps WHERE {clause} ORDER BY name", tuple(where.values()))
+        names = [ description[0] for description in cursor.description ]
+        return [ dict(zip(names, row)) for row in cursor ]
+
+    def summarise_steps(self, algorithm: str, memory: str, long_memory: str, max_n: int | None = None) -> dict[tuple, dict]:
+        """
+        Per-`n` summaries (`n`, `count`, `mean` and (sample) `std` of steps, as `results.summarise_steps`) over all catalogued tests of a cell,
+        one per configuration `(compact, corpus, seed)` of their sweeps, as tests of different configurations are not samples of the same steps.
+        Deviations are summed about each group's mean, so that variances do not cancel out for large step counts.
+        """
+        import numpy as np
+        rows = self._connection.execute(
+            "SELECT compact, corpus, seed, n, COUNT(*), AVG(steps), SUM(deviation * deviation) FROM ("
+            "SELECT s.compact, s.corpus, s.seed, t.n, t.steps, t.steps - AVG(t.steps) OVER (PARTITION BY s.compact, s.corpus, s.seed, t.n) AS deviation "
+            "FROM tests t JOIN sweeps s ON s.id = t.sweep_id WHERE t.algorithm = ? AND t.mem = ? AND t.long = ? AND t.n <= ?"
+            ") GROUP BY compact, corpus, seed, n ORDER BY compact, corpus, seed, n",
+            (algorithm, memory == "y", long_memory == "y", max_n if max_n is not None else 2 ** 62),
+        ).fetchall()
+        groups: dict[tuple, list[tuple]] = {}
+        for compact, corpus, seed, *row in rows:
+            groups.setdefault((bool(compact), corpus, seed), []).append(row)
+        summaries = {}
+        for config, group in groups.items():
+            ns, counts, means, squares = (np.array(column, dtype=float) for column in zip(*group))
+            stds = np.sqrt(np.divide(squares, counts - 1, out=np.zeros_like(squares), where=counts > 1))
+            summaries[config] = { "n": ns.astype(int), "count": counts.astype(int), "mean": means, "std": stds }
+        return summaries
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __enter__(self) -> "Catalogue":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+class CatalogueWriter:
+    """ Buffered writer of the tests of a sweep into a catalogue; same `write`/`flush`/`close` interface as `results.ResultSink`. """
+
+    def __init__(self, path: str, name: str, config: dict, result_file: str | None, trace_file: str | None = None, fresh: bool = True, buffer_size: int = 1000) -> None:
+        self.catalogue: Catalogue = Catalogue(path)
+        self.sweep_id: int = self.catalogue.add_sweep(name, config, result_file, trace_file, fresh)
+        self.buffer_size: int = buffer_size
+        self._buffer: list[dict] = []
+
+    def write(self, record: dict) -> None:
+        self._buffer.append(record)
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._buffer:
+            self.catalogue.add_tests(self.sweep_id, self._buffer)
+            self._buffer = []
+
+    def close(self) -> None:
+        self.flush()
+        self.catalogue.close()
+
+def import_results(results_path: str = RESULTS_PATH, catalogue_path: str | None = None) -> list[str]:
+    """
+    Imports all results files of `results_path` (of any format; reduced ones only if their original is missing) into the catalogue,
+    taking sweep parameters from their filenames; returns the names of the imported sweeps.
+    """
+    catalogue_path = catalogue_path or os.path.join(results_path, CATALOGUE_NAME)
+    filenames = set(os.listdir(results_path))
+    imported = []
+    with Catalogue(catalogue_path) as catalogue:
+        for filename in sorted(filenames):
+            stem, extension = os.path.splitext(filename.removesuffix(".reduced"))
+            if extension[1:] not in ("txt", "csv", "jsonl", "parquet") or (filename.endswith(".reduced") and stem + extension in filenames):
+                continue
+            try:
+                config = parse_sweep_name(stem)
+            except ValueError:
+                print(f"Skipped: {filename} (not named as a sweep of algorithm {', '.join(ALGORITHMS)})")
+                continue
+            trace_file = next((f"{stem}.{ext}" for ext in ("trace", "btrace", "tstore") if f"{stem}.{ext}" in filenames), None)
+            columns = load_results(os.path.join(results_path, filename))
+            records = [ { "algorithm": config["algorithm"], "seed": -1 if config["seed"] is None else config["seed"] } for _ in range(len(columns["n"])) ]
+            for name, values in columns.items():
+                if name in TEST_FIELDS:
+                    for record, value in zip(records, values.tolist()):
+                        record[name] = value
+            sweep_id = catalogue.add_sweep(stem, config, filename, trace_file)
+            catalogue.add_tests(sweep_id, records)
+            imported.append(stem)
+            print(f"Imported: {stem} ({len(records)} tests)")
+    return imported
+
+def main():
+    parser = argparse.ArgumentParser(description="Import results files into a results catalogue, or list or remove its sweeps.")
+    parser.add_argument("command", choices=["import", "list", "remove"])
+    parser.add_argument("results_path", nargs="?", default=RESULTS_PATH)
+    parser.add_argument("--catalogue", help=f"path to the catalogue (`{CATALOGUE_NAME}` under the results path by default)")
+    parser.add_argument("--names", nargs="*", default=[], help="names of the sweeps to remove")
+    args = parser.parse_args()
+    catalogue_path = args.catalogue or os.path.join(args.results_path, CATALOGUE_NAME)
+    if args.command == "import":
+        import_results(args.results_path, catalogue_path)
+        return
+    with Catalogue(catalogue_path) as catalogue:
+        if args.command == "remove":
+            for name in args.names:
+                catalogue.remove_sweep(name)
+            return
+        for sweep in catalogue.sweeps():
+            print(f"{sweep['name']}: {sweep['algorithm']}, N={sweep['N']}, reps={sweep['reps']}, mem={sweep['mem']}, long={sweep['long']}")
+
+if __name__ == "__main__":
+    main()
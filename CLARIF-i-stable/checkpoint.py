@@ -0,0 +1,63 @@
+# checkpoint.py
+
+import os
+import pickle
+
+from api.Learner import Learner
+from stats import Welford
+
+class Checkpoint:
+    """
+    Snapshot of a sweep taken in between two tests, so that it can be resumed later on.
+
+    Attributes:
+        config: The sweep parameters (algorithm, N, reps, memory, etc.)
+        n, rep: The cursor of the next test to run
+        rng_state: The state of `random` right before running test `(n, rep)`
+        learner: The (shared) learner, if any, right before running test `(n, rep)`
+        offsets: Sizes of the sweep's output files at the time of the snapshot
+        accumulator: Running statistics of the steps of `n` so far (used by adaptive sweeps)
+        cell_metrics: Work counters aggregated per `n` so far (used by counted sweeps)
+        progress: Running statistics of steps and wall times per `n` so far (see `progress.ProgressMonitor.cells`)
+        hypothesis_log: The state of the sweep's hypothesis log, if kept (see `hypotheses.HypothesisLog.state`)
+        cell_timing: Results output times aggregated per `n` so far (used by timed sweeps)
+    """
+
+    def __init__(self, config: dict, n: int, rep: int, rng_state: tuple, learner: Learner | None, offsets: dict[str, int], accumulator: Welford | None = None, cell_metrics: dict | None = None, progress: dict | None = None, hypothesis_log: dict | None = None, cell_timing: dict | None = None) -> None:
+        self.config: dict = config
+        self.n: int = n
+        self.rep: int = rep
+        self.rng_state: tuple = rng_state
+        self.learner: Learner | None = learner
+        self.offsets: dict[str, int] = offsets
+        self.accumulator: Welford | None = accumulator
+        self.cell_metrics: dict | None = cell_metrics
+        self.progress: dict | None = progress
+        self.hypothesis_log: dict | None = hypothesis_log
+        self.cell_timing: dict | None = cell_timing
+
+    def save(self, path: str) -> None:
+        """ Writes the checkpoint atomically, so that an interruption never leaves a half-written checkpoint behind. """
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as file:
+            pickle.dump(self, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "Checkpoint":
+        with open(path, "rb") as file:
+            checkpoint = pickle.load(file)
+        if not isinstance(checkpoint, cls):
+            raise ValueError(f"Not a checkpoint file: {path}")
+        return checkpoint
+
+    def restore_files(self) -> None:
+        """ Truncates output files to their size at the time of the snapshot, dropping anything written afterwards. """
+        for path, offset in self.offsets.items():
+            if os.path.getsize(path) < offset:
+                raise ValueError(f"File '{path}' is shorter than its checkpointed size ({offset} bytes)")
+            with open(path, "r+b") as file:
+                file.truncate(offset)
+
+def file_offsets(paths: list[str]) -> dict[str, int]:
+    return { path: os.path.getsize(path) for path in paths }
@@ -0,0 +1,139 @@
+# corpus.py
+
+"""
+Shared start-state corpora, so that all algorithm and memory variants are compared on the very same permutations (paired comparisons).
+
+A corpus holds `reps` start states (permutations of `0..n-1`) for each `n` in `1..N`, stored as follows (all integers little-endian):
+    header:     MAGIC, N, reps (uint32 each), seed (int64)
+    body:       for each `n`, `reps` packed permutations of width `traces.value_width(n)`
+The permutations of each `n` are drawn from their own `random.Random`, so the corpus of some `n` does not depend on `N`.
+"""
+
+import os
+import random
+import struct
+import argparse
+from array import array
+
+from api.State import State
+from utils import sorting_keys
+from traces import TYPECODES, value_width
+
+MAGIC = b"CLCORPS1"
+HEADER = struct.Struct(f"<{len(MAGIC)}sIIq")
+
+class Corpus:
+    def __init__(self, N: int, reps: int, seed: int, permutations: dict[int, list[list[int]]]) -> None:
+        self.N: int = N
+        self.reps: int = reps
+        self.seed: int = seed
+        self.permutations: dict[int, list[list[int]]] = permutations
+        self._states: dict[int, list[State]] = {}
+        self._goal_states: dict[int, State] = {}
+
+    @classmethod
+    def generate(cls, N: int, reps: int, seed: int) -> "Corpus":
+        permutations = {}
+        for n in range(1, N + 1):
+            rng = random.Random(f"{seed}:{n}")
+            permutations[n] = []
+            for _ in range(reps):
+                values = list(range(n))
+                rng.shuffle(values)
+                permutations[n].append(values)
+        return cls(N, reps, seed, permutations)
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as file:
+            file.write(HEADER.pack(MAGIC, self.N, self.reps, self.seed))
+            for n in range(1, self.N + 1):
+                packed = array(TYPECODES[value_width(n)])
+                for values in self.permutations[n]:
+                    packed.extend(values)
+                file.write(packed.tobytes())
+
+    @classmethod
+    def load(cls, path: str) -> "Corpus":
+        with open(path, "rb") as file:
+            data = file.read()
+        magic, N, reps, seed = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError(f"Not a corpus file: {path}")
+        offset = HEADER.size
+        permutations = {}
+        for n in range(1, N + 1):
+            width = value_width(n)
+            packed = array(TYPECODES[width], data[offset:offset + reps * n * width])
+            offset += reps * n * width
+            permutations[n] = [ packed[k * n:(k + 1) * n].tolist() for k in range(reps) ]
+        return cls(N, reps, seed, permutations)
+
+    def start_states(self, n: int) -> list[State]:
+        """ Pre-built start states of size `n`, built once and shared by all tests (they are never mutated). """
+        if n not in self._states:
+            keys = sorting_keys(n)
+            self._states[n] = [ State(dict(zip(keys, values))) for values in self.permutations[n] ]
+        return self._states[n]
+
+    def goal_state(self, n: int) -> State:
+        if n not in self._goal_states:
+            self._goal_states[n] = State(dict(zip(sorting_keys(n), range(n))))
+        return self._goal_states[n]
+
+    def check(self, N: int, reps: int) -> None:
+        if N > self.N or reps > self.reps:
+            raise ValueError(f"Corpus of N={self.N}, reps={self.reps} is too small for N={N}, reps={reps}")
+
+def run_variants(corpus_path: str, configs: list[dict], results_path: str, verbose: bool = True) -> None:
+    """ Runs the sweeps of `configs` one after the other in this process, all of them replaying the same, pre-built, corpus states. """
+    from main import run_sweep, sweep_name
+    corpus = Corpus.load(corpus_path)
+    for config in configs:
+        config = dict(config, corpus=corpus_path)
+        if verbose:
+            print(f"Running {sweep_name(config)}")
+        run_sweep(config, results_path, verbose=verbose, corpus=corpus)
+        if verbose:
+            print()
+
+def main():
+    from main import RESULTS_PATH, ALGORITHMS
+    CWD = os.path.abspath(os.path.dirname(__file__))
+    parser = argparse.ArgumentParser(description="Generate a start-state corpus, or run paired comparisons on one.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    generate_parser = subparsers.add_parser("generate", help="generate a corpus")
+    generate_parser.add_argument("--N", type=int, required=True)
+    generate_parser.add_argument("--reps", type=int, required=True)
+    generate_parser.add_argument("--seed", type=int, default=0)
+    generate_parser.add_argument("--output", help="defaults to `corpora/corpus_N<N>_reps<reps>_seed<seed>.corpus`")
+    compare_parser = subparsers.add_parser("compare", help="run all given algorithm and memory variants on a corpus")
+    compare_parser.add_argument("corpus")
+    compare_parser.add_argument("--algorithms", nargs="+", choices=ALGORITHMS.keys(), default=list(ALGORITHMS.keys()))
+    compare_parser.add_argument("--memory", nargs="+", choices=["n", "y", "long"], default=["n", "y", "long"],
+                                help="memory variants: none, within each n, across all n")
+    compare_parser.add_argument("--N", type=int, help="defaults to the corpus' N")
+    compare_parser.add_argument("--reps", type=int, help="defaults to the corpus' reps")
+    compare_parser.add_argument("--results-path", default=RESULTS_PATH)
+    args = parser.parse_args()
+    if args.command == "generate":
+        output = args.output or os.path.join(CWD, "corpora", f"corpus_N{args.N}_reps{args.reps}_seed{args.seed}.corpus")
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        Corpus.generate(args.N, args.reps, args.seed).save(output)
+        print(f"Saved corpus at: {output}")
+        return
+    corpus = Corpus.load(args.corpus)
+    memory_modes = { "n": ("n", "n"), "y": ("y", "n"), "long": ("y", "y") }
+    configs = [ {
+        "algorithm": algorithm,
+        "N": args.N or corpus.N,
+        "reps": args.reps or corpus.reps,
+        "memory": memory_modes[mode][0],
+        "long_memory": memory_modes[mode][1],
+        "full_reporting": False,
+        "report_traces": False,
+        "seed": None,
+    } for algorithm in args.algorithms for mode in args.memory ]
+    run_variants(args.corpus, configs, args.results_path)
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,12 @@
 # debug.py
 
-import sys
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 
-from utils import generate_quick_sort_partial_test_case
+from utils import sorting_keys
+from profiling import CellProfiler, PROFILERS
+from main import ALGORITHMS
 
 from api.Learner import Learner
 from api.State import State
@@ -16,11 +20,17 @@ def run_specific_test_case(
         full_reporting: bool,
         start_state: State,
         goal_state: State,
-        fn: Callable
+        fn: Callable,
+        profiler: CellProfiler | None = None,
     ) -> None:
-    test = fn(n, learner, full_reporting, start_state, goal_state)
+    test = fn(n, learner, full_reporting, start_state=start_state, goal_state=goal_state)
     print("Running test...")
+    if profiler is not None:
+        profiler.profiler.enable()
     test.run()
+    if profiler is not None:
+        profiler.profiler.disable()
+        profiler.profiled += 1
     print("Test finished running!")
     report = test.report()
     print("=" * 30)
@@ -35,20 +45,137 @@ def run_multiple_test_cases(
         goal_states: State,
         fn: Callable,
         with_mem: bool,
+        profiler: CellProfiler | None = None,
     ) -> None:
     learner = None
     if with_mem:
         learner = Learner()
     for start_state, goal_state in zip(start_states, goal_states):
         print(f"start state: {start_state}")
-        run_specific_test_case(n, learner, full_reporting, start_state, goal_state, fn)
+        run_specific_test_case(n, learner, full_reporting, start_state, goal_state, fn, profiler)
+
+# Delta debugging: start states are handled as lists of values (in sorted key order), so that candidates are cheap to pickle for workers.
+
+def reproduce(values: list[list[int]], algorithm: str, with_mem: bool, max_steps: int | None, timeout: float | None) -> str | None:
+    """
+    Replays the start states `values` in order (sharing a learner if `with_mem`) towards the sorted goal state;
+    returns the failure they lead to, i.e., `"duplicate advice"` or `"timeout"` (of a test, as per `max_steps` and `timeout`), if any.
+    """
+    n = len(values[0])
+    keys = sorting_keys(n)
+    goal_state = State(dict(zip(keys, range(n))))
+    learner = Learner() if with_mem else None
+    for state_values in values:
+        test = ALGORITHMS[algorithm](n, learner, False, False, State(dict(zip(keys, state_values))), goal_state)
+        test.max_steps, test.timeout = max_steps, timeout
+        try:
+            test.run()
+        except TimeoutError:
+            return "timeout"
+        except ValueError as e:
+            if str(e).startswith("Duplicate advice"):
+                return "duplicate advice"
+            raise
+    return None
+
+def drop_value(values: list[list[int]], value: int) -> list[list[int]]:
+    """ Start states of size `n - 1`, by removing `value` from each one of `values` (and shifting the larger ones down, to keep their order). """
+    return [ [ x - (x > value) for x in state_values if x != value ] for state_values in values ]
+
+class Minimiser:
+    """
+    Reduces a sequence of start states that leads to a failure (see `reproduce`) to a minimal one leading to the same failure:
+    delta debugging (ddmin) finds a minimal sub-sequence (order is kept, since a shared learner depends on it), and values are dropped
+    from all states to find a minimal `n`, alternately, until neither helps. Candidates of each round are evaluated in parallel,
+    and the first one (in a fixed order, so that results do not depend on scheduling) that fails is kept.
+    """
+
+    def __init__(self, algorithm: str, with_mem: bool, max_steps: int | None = 10000, timeout: float | None = 60.0, workers: int | None = None) -> None:
+        self.params: tuple = (algorithm, with_mem, max_steps, timeout)
+        self.workers: int | None = workers
+        self.evaluations: int = 0
+        self._executor: ProcessPoolExecutor | None = None
+
+    def first_failing(self, candidates: list[list[list[int]]], failure: str) -> int | None:
+        """ Index of the first candidate that leads to `failure`, if any. """
+        if self._executor is None:
+            for index, candidate in enumerate(candidates):
+                self.evaluations += 1
+                if reproduce(candidate, *self.params) == failure:
+                    return index
+            return None
+        futures = [ self._executor.submit(reproduce, candidate, *self.params) for candidate in candidates ]
+        self.evaluations += len(futures)
+        found = next((index for index, future in enumerate(futures) if future.result() == failure), None)
+        for future in futures:
+            future.cancel()
+        return found
+
+    def minimise_sequence(self, values: list[list[int]], failure: str) -> list[list[int]]:
+        granularity = 2
+        while len(values) >= 2:
+            bounds = [ len(values) * k // granularity for k in range(granularity + 1) ]
+            subsets = [ values[lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:]) ]
+            complements = [ values[:lo] + values[hi:] for lo, hi in zip(bounds[:-1], bounds[1:]) ] if granularity > 2 else []
+            index = self.first_failing(subsets + complements, failure)
+            if index is not None and index < granularity:
+                values, granularity = subsets[index], 2
+            elif index is not None:
+                values, granularity = complements[index - granularity], max(granularity - 1, 2)
+            elif granularity < len(values):
+                granularity = min(2 * granularity, len(values))
+            else:
+                break
+        return values
+
+    def minimise_n(self, values: list[list[int]], failure: str) -> list[list[int]]:
+        while len(values[0]) > 1:
+            candidates = [ drop_value(values, value) for value in range(len(values[0])) ]
+            index = self.first_failing(candidates, failure)
+            if index is None:
+                break
+            values = candidates[index]
+        return values
+
+    def minimise(self, values: list[list[int]]) -> tuple[list[list[int]], str]:
+        """ Returns the minimised start states along with the failure they lead to; raises a `ValueError` if `values` do not fail. """
+        failure = reproduce(values, *self.params)
+        if failure is None:
+            raise ValueError("The start states do not lead to a failure")
+        print(f"Reproduced: {failure} (n={len(values[0])}, {len(values)} start state(s))")
+        if self.workers != 1:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        try:
+            while True:
+                size = (len(values), len(values[0]))
+                values = self.minimise_sequence(values, failure)
+                values = self.minimise_n(values, failure)
+                print(f"Reduced to n={len(values[0])}, {len(values)} start state(s) ({self.evaluations} evaluations)")
+                if (len(values), len(values[0])) == size:
+                    return values, failure
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
 
 def main():
+    parser = argparse.ArgumentParser(description="Replay specific start states; missing arguments are prompted for.")
+    parser.add_argument("states_file", nargs="?", help="file with one start state per line")
+    parser.add_argument("--with-mem", choices=["y", "n"])
+    parser.add_argument("--offset", type=int)
+    parser.add_argument("--algorithm", choices=ALGORITHMS.keys(), default="qp")
+    parser.add_argument("--profile", choices=PROFILERS.keys(), help="profile the replayed tests")
+    parser.add_argument("--profile-interval", type=float, default=0.001, help="sampling interval (seconds) of the `sampling` profiler")
+    parser.add_argument("--minimise", action="store_true",
+                        help="instead of replaying them, reduce the start states to a minimal sequence (and n) leading to the same duplicate advice or timeout")
+    parser.add_argument("--max-steps", type=int, default=10000, help="with --minimise, coaching steps after which a test counts as timed out")
+    parser.add_argument("--timeout", type=float, default=60.0, help="with --minimise, seconds after which a test counts as timed out")
+    parser.add_argument("--workers", type=int, help="with --minimise, number of candidates to evaluate in parallel (all CPUs by default)")
+    parser.add_argument("-o", "--output", help="with --minimise, file to save the minimised start states in (`<states file>_min.txt` by default)")
+    args = parser.parse_args()
     start_states: list[State] = []
-    if len(sys.argv) > 2:
-        print("E: Usage: `python3 debug.py` or `python3 debug.py <states_file>`", file=sys.stderr)
-    elif len(sys.argv) == 2:
-        states_filename = sys.argv[1]
+    if args.states_file is not None:
+        states_filename = args.states_file
         with open(states_filename, "r") as states_file:
             for line in states_file:
                 state = State.from_str(line)
@@ -58,11 +185,24 @@ def main():
         state = State.from_str(start_state_str)
         start_states.append(state)
     n = len(start_states[0])
-    with_mem = input("With memory (y/n): ") == "y"
-    offset = int(input("Offset: "))
+    with_mem = (args.with_mem if args.with_mem is not None else input("With memory (y/n): ")) == "y"
+    if args.minimise:
+        minimiser = Minimiser(args.algorithm, with_mem, args.max_steps, args.timeout, args.workers)
+        values, failure = minimiser.minimise([ [ v for _, v in sorted(state.state.items()) ] for state in start_states ])
+        keys = sorting_keys(len(values[0]))
+        output_path = args.output or ("debug" if args.states_file is None else os.path.splitext(args.states_file)[0]) + "_min.txt"
+        with open(output_path, "w") as output_file:
+            output_file.writelines(f"{State(dict(zip(keys, state_values)))}\n" for state_values in values)
+        print(f"Minimal case of {failure} (n={len(values[0])}, {len(values)} start state(s)) saved at: {output_path}")
+        return
+    offset = args.offset if args.offset is not None else int(input("Offset: "))
     goal_state = State(dict(zip(start_states[0].state.keys(), [ x for x in range(n) ])))
     goal_states = [goal_state] * len(start_states)
-    run_multiple_test_cases(n, True, start_states[offset:], goal_states[offset:], generate_quick_sort_partial_test_case, with_mem)
+    profiler = CellProfiler(args.profile, interval=args.profile_interval) if args.profile is not None else None
+    run_multiple_test_cases(n, True, start_states[offset:], goal_states[offset:], ALGORITHMS[args.algorithm], with_mem, profiler)
+    if profiler is not None:
+        name = "debug" if args.states_file is None else "debug_" + os.path.splitext(os.path.basename(args.states_file))[0]
+        print(f"Saved profile at: {profiler.dump(name)}")
 
 if __name__ == "__main__":
     main()
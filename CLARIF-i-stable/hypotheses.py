@@ -0,0 +1,112 @@
+# hypotheses.py
+
+"""
+Versioned log of the hypotheses of a sweep (`<name>.hyp`), so that results refer to a hypothesis by version (`@v<id>` on legacy lines,
+`hypothesis_version` in structured results) instead of repeating it in full for every test, which grows without bound under long memory.
+
+Each version is a line `v<id>; <base>; <edit>; ...`, where `<base>` is `v<id>` of the previous line, the version it is a diff of,
+or `-` for a full one (that of a new learner, or one whose kept rules have been reordered), and edits are applied in order:
+`-<i>` removes rule `i` of the base (in decreasing order of `i`), and `+<i> <rule>` inserts a new rule at position `i` (in increasing order of `i`).
+A test that does not change the hypothesis refers to the same version as the previous one, at no cost.
+"""
+
+from api.Learner import Learner
+from api.IndexedLearner import IndexedLearner
+
+class HypothesisLog:
+    """
+    Buffered writer of a hypothesis log; same `flush`/`close` interface as `results.ResultSink`.
+    Rules are told apart by identity (learners keep their rule objects), so only new rules are ever turned into strings.
+    """
+    extension: str = "hyp"
+
+    def __init__(self, path: str, append: bool = False, buffer_size: int = 1000) -> None:
+        self.path: str = path
+        self.buffer_size: int = buffer_size
+        self.next_version: int = 0
+        self._buffer: list[str] = []
+        self._file = open(path, "a" if append else "w")
+        self._learner: Learner | IndexedLearner | None = None # the learner of the last logged version, kept alive so that its rules' ids are not reused
+        self._learner_version: int | None = None
+        self._version: int | None = None
+        self._order: list[int] = [] # ids of the rules of the last logged version, in order
+        self._rules: dict[int, object] = {} # id -> rule of the last logged version
+
+    def version(self, learner: Learner | IndexedLearner) -> int:
+        """ Id of the version of the learner's current hypothesis, logging it (as a diff of the last logged one, if possible) if new. """
+        if learner is self._learner and learner.version == self._learner_version:
+            return self._version
+        hypothesis = learner.hypothesis
+        current = [ id(rule) for rule in hypothesis ]
+        edits = None
+        if learner is self._learner:
+            current_ids = set(current)
+            kept = [ key for key in self._order if key in current_ids ]
+            if kept == [ key for key in current if key in self._rules ]:
+                edits = [ f"-{i}" for i in range(len(self._order) - 1, -1, -1) if self._order[i] not in current_ids ]
+                edits += [ f"+{i} {rule}" for i, rule in enumerate(hypothesis) if id(rule) not in self._rules ]
+        if edits is None:
+            line = "; ".join([ f"v{self.next_version}", "-" ] + [ f"+{i} {rule}" for i, rule in enumerate(hypothesis) ])
+        elif edits:
+            line = "; ".join([ f"v{self.next_version}", f"v{self._version}" ] + edits)
+        else:
+            line = None # e.g., advice that only re-sorted the hypothesis
+        if line is not None:
+            self._buffer.append(line + "\n")
+            if len(self._buffer) >= self.buffer_size:
+                self.flush()
+            self._version = self.next_version
+            self.next_version += 1
+        self._learner, self._learner_version = learner, learner.version
+        self._order = current
+        self._rules = { id(rule): rule for rule in hypothesis }
+        return self._version
+
+    def state(self, learner: Learner | IndexedLearner | None) -> dict:
+        """ What a checkpoint needs to resume the log, given the sweep's (shared) learner, which is checkpointed along with it. """
+        return {
+            "next_version": self.next_version,
+            "version": self._version,
+            "current": learner is not None and learner is self._learner and learner.version == self._learner_version,
+        }
+
+    def restore(self, state: dict, learner: Learner | IndexedLearner | None) -> None:
+        """ Resumes the log from a checkpointed `state`, so that it carries on exactly as it would have (`learner` being the restored one). """
+        self.next_version, self._version = state["next_version"], state["version"]
+        if state["current"]:
+            self._learner, self._learner_version = learner, learner.version
+            self._order = [ id(rule) for rule in learner.hypothesis ]
+            self._rules = { id(rule): rule for rule in learner.hypothesis }
+
+    def flush(self) -> None:
+        if self._buffer:
+            self._file.write("".join(self._buffer))
+            self._buffer = []
+        self._file.flush()
+
+    def close(self) -> None:
+        self.flush()
+        self._file.close()
+
+def iter_hypotheses(path: str):
+    """ Yields `(version, rules)` for each version of a hypothesis log, rules being strings; `rules` is only valid until the next version. """
+    rules: list[str] = []
+    with open(path, "r") as file:
+        for line in file:
+            fields = line.rstrip("\n").split("; ")
+            if fields[1] == "-":
+                rules = []
+            for edit in fields[2:]:
+                if edit[0] == "-":
+                    del rules[int(edit[1:])]
+                else:
+                    index, rule = edit[1:].split(" ", 1)
+                    rules.insert(int(index), rule)
+            yield int(fields[0][1:]), rules
+
+def load_hypothesis(path: str, version: int) -> list[str]:
+    """ The rules (as strings) of a version of a hypothesis log. """
+    for logged_version, rules in iter_hypotheses(path):
+        if logged_version == version:
+            return rules
+    raise KeyError(f"Hypothesis version {version} not found in {path}")
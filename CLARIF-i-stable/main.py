@@ -1,9 +1,27 @@
 # main.py
 import os
-import math
+import json
+import time
+import random
+import argparse
+import tracemalloc
 
 from utils import generate_bubble_sort_test_case, generate_quick_sort_test_case, generate_bubble_sort_partial_test_case, generate_quick_sort_partial_test_case
+from utils import generate_bubble_sort_compact_test_case, generate_quick_sort_compact_test_case
 from api.Learner import Learner
+from api.IndexedLearner import IndexedLearner
+from api.CompactState import CompactState
+from api.Metrics import PhaseTimer, METRICS, deep_sizeof, peak_rss, reset_peak_rss
+from api.TraceRetention import TraceRetention
+from checkpoint import Checkpoint, file_offsets
+from results import RESULT_SINKS, RESULT_FIELDS, TIMING_FIELDS, COUNTER_FIELDS, MEMORY_FIELDS, HYPOTHESIS_FIELDS, make_record
+from hypotheses import HypothesisLog
+from traces import TRACE_WRITERS
+from corpus import Corpus
+from stats import Welford, should_stop
+from profiling import CellProfiler, PROFILERS, parse_cells
+from progress import ProgressMonitor
+from catalogue import CatalogueWriter, CATALOGUE_NAME
 
 ALGORITHMS = {
     'b': generate_bubble_sort_test_case,
@@ -12,42 +30,333 @@ ALGORITHMS = {
     'qp': generate_quick_sort_partial_test_case,
 }
 
-def main():
-    CWD = os.path.abspath(os.path.dirname(__file__))
-    RESULTS_PATH = os.path.join(CWD, "raw_results")
-    algorithm = input("Enter algorithm ({q}uicksort, {b}ubblesort, append {p}artial): ")
-    N = int(input("Enter N: "))
-    reps = int(input("Enter # of repetitions: "))
-    memory = input("Remember advice (y/n): ")
+# Large-n engine (see `api.IndexedLearner`), for partial-state algorithms only
+COMPACT_ALGORITHMS = {
+    'bp': generate_bubble_sort_compact_test_case,
+    'qp': generate_quick_sort_compact_test_case,
+}
+
+CWD = os.path.abspath(os.path.dirname(__file__))
+RESULTS_PATH = os.path.join(CWD, "raw_results")
+
+def sweep_name(config: dict) -> str:
+    name = f"{config['algorithm']}_test_N{config['N']}_reps{config['reps']}_mem{config['memory']}_long{config['long_memory']}"
+    if config.get("seed") is not None:
+        name += f"_seed{config['seed']}"
+    if config.get("corpus") is not None:
+        name += f"_corpus{os.path.splitext(os.path.basename(config['corpus']))[0]}"
+    if config.get("compact", False):
+        name += "_compact"
+    if config.get("adaptive") is not None:
+        name += f"_ci{config['adaptive']['ci_half_width']:g}{'rel' if config['adaptive'].get('relative', False) else ''}"
+    return name
+
+def add_cell_metrics(cell: dict, metrics: dict) -> None:
+    """ Adds the `MetricsRegistry.snapshot` of a test to the totals of its sweep cell. """
+    cell["tests"] += 1
+    for key in ("counts", "rule_firings"):
+        for name, count in metrics[key].items():
+            cell[key][name] = cell[key].get(name, 0) + count
+
+def run_sweep(config: dict, results_path: str = RESULTS_PATH, checkpoint_every: int = 100, resume: bool = False, verbose: bool = True, corpus: Corpus | None = None, progress_every: float = 5.0, catalogue: bool = True) -> None:
+    """
+    Runs all `reps` tests for each `n` in `1..N`, periodically checkpointing the sweep so that it can be resumed.
+    A resumed sweep produces exactly the same output files as an uninterrupted one (apart from wall times);
+    resuming a sweep without a checkpoint (e.g., a completed one) raises a `FileNotFoundError`, leaving its outputs untouched.
+    If `config["seed"]` is set, `random` is seeded with it, so that the sweep is reproducible.
+    Results are written through a buffered `results.ResultSink` of format `config["result_format"]` (legacy text by default),
+    and traces, if reported, through a `traces` writer of format `config["trace_format"]` (legacy text by default).
+    If `config["corpus"]` is set, start states are replayed from that `corpus.Corpus` (or from `corpus`, if already loaded) instead of being shuffled.
+    If `config["adaptive"]` is set, `reps` is the maximum number of repetitions per `n`, and repetitions stop early as per `stats.should_stop`.
+    If `config["timing"]` is set, each test is timed per phase (`results.TIMING_FIELDS`), which requires a structured result format;
+    the time spent writing results (serialising records and writing out the buffer) is also summed per `n` in `<name>.timing.json`.
+    If `config["counters"]` is set, each test's work is counted (`results.COUNTER_FIELDS`), which requires a structured result format;
+    counters (and per-rule firings) are also summed per `n` in `<name>.counters.json`.
+    If `config["memory_stats"]` is set, the memory usage of each test is measured (`results.MEMORY_FIELDS`, through `tracemalloc`),
+    which requires a structured result format; results then form a per-test time series of memory usage.
+    If `config["compact"]` is set, tests run on the large-n engine (`COMPACT_ALGORITHMS`), which does not report traces.
+    If `config["profile"]` is set (`mode`, `cells` and `interval`, see `profiling.CellProfiler`), the chosen cells are profiled into `profiles/<name>.*`.
+    Progress (throughput, steps per `n` and ETA, see `progress.ProgressMonitor`) is shown if `verbose`, and saved every `progress_every` seconds in `<name>.progress.json`.
+    If `config["hypothesis_log"]` is set, hypotheses are logged (as diffs) in `<name>.hyp` (see `hypotheses.py`) and results refer to them by version,
+    rather than text results repeating the full hypothesis of each test.
+    If `catalogue` is set, the sweep and its tests are also recorded in the results catalogue of `results_path` (see `catalogue.py`), in bulk at each checkpoint.
+    """
+    algorithm, N, reps = config["algorithm"], config["N"], config["reps"]
+    memory, long_memory = config["memory"], config["long_memory"]
+    full_reporting, report_traces = config["full_reporting"], config["report_traces"]
+    adaptive = config.get("adaptive")
+    timing = config.get("timing", False)
+    counters = config.get("counters", False)
+    memory_stats = config.get("memory_stats", False)
+    compact = config.get("compact", False)
+    hypothesis_log = config.get("hypothesis_log", False)
+    if compact and algorithm not in COMPACT_ALGORITHMS:
+        raise ValueError(f"The large-n engine only supports algorithms {', '.join(COMPACT_ALGORITHMS.keys())}, not `{algorithm}`")
+    if compact and report_traces:
+        raise ValueError("The large-n engine does not report traces")
+    generate, learner_class = (COMPACT_ALGORITHMS[algorithm], IndexedLearner) if compact else (ALGORITHMS[algorithm], Learner)
+    profiler = CellProfiler(**config["profile"]) if config.get("profile") is not None else None
+    if config.get("corpus") is not None:
+        corpus = corpus or Corpus.load(config["corpus"])
+        corpus.check(N, reps)
+    name = sweep_name(config)
+    sink_class = RESULT_SINKS[config.get("result_format", "txt")]
+    if (timing or counters or memory_stats) and not sink_class.structured:
+        raise ValueError(f"Timing, counters and memory stats require a structured result format, not `{sink_class.extension}`")
+    res_file_name = os.path.join(results_path, f"{name}.{sink_class.extension}")
+    trace_writer_class = TRACE_WRITERS[config.get("trace_format", "trace")]
+    trace_file_name = os.path.join(results_path, f"{name}.{trace_writer_class.extension}")
+    checkpoint_path = os.path.join(results_path, f"{name}.ckpt")
+    counters_path = os.path.join(results_path, f"{name}.counters.json")
+    timing_path = os.path.join(results_path, f"{name}.timing.json")
+    progress_path = os.path.join(results_path, f"{name}.progress.json")
+    hypotheses_path = os.path.join(results_path, f"{name}.{HypothesisLog.extension}")
+    output_files = [res_file_name] + ([trace_file_name] if report_traces else []) + ([hypotheses_path] if hypothesis_log else [])
+    learner: Learner | IndexedLearner | None = learner_class() if long_memory == "y" else None
+    start_n, start_rep = 1, 0
+    accumulator = Welford()
+    cell_metrics: dict[int, dict] = {} # n -> { "tests": ..., "counts": { ... }, "rule_firings": { ... } }
+    cell_timing: dict[int, dict] = {} # n -> { "tests": ..., "results_io_ns": ... }
+    monitor = ProgressMonitor(name, N, reps, progress_path, refresh_every=progress_every, default_exponent=2 if compact else 3)
+    hypotheses_state = None
+    if resume and not sink_class.resumable:
+        raise ValueError(f"Sweeps with `{sink_class.extension}` results cannot be resumed")
+    if resume and not os.path.isfile(checkpoint_path):
+        # never start over (truncating the outputs) when asked to resume, e.g., a sweep that has already completed
+        completed = " (its results are complete)" if os.path.isfile(res_file_name) else ""
+        raise FileNotFoundError(f"No checkpoint to resume sweep {name} from: {checkpoint_path}{completed}")
+    resuming = resume
+    if resuming:
+        checkpoint = Checkpoint.load(checkpoint_path)
+        if checkpoint.config != config:
+            raise ValueError(f"Checkpoint parameters {checkpoint.config} do not match {config}")
+        checkpoint.restore_files()
+        random.setstate(checkpoint.rng_state)
+        learner = checkpoint.learner
+        start_n, start_rep = checkpoint.n, checkpoint.rep
+        accumulator = checkpoint.accumulator or accumulator
+        cell_metrics = checkpoint.cell_metrics or cell_metrics
+        cell_timing = checkpoint.cell_timing or cell_timing
+        monitor.cells = checkpoint.progress or monitor.cells
+        hypotheses_state = checkpoint.hypothesis_log
+        if verbose:
+            print(f"Resuming from n={start_n}, rep={start_rep}")
+    elif config.get("seed") is not None:
+        random.seed(config["seed"])
+    fields = RESULT_FIELDS | (TIMING_FIELDS if timing else {}) | (COUNTER_FIELDS if counters else {}) | (MEMORY_FIELDS if memory_stats else {}) | (HYPOTHESIS_FIELDS if hypothesis_log else {})
+    tracing = memory_stats and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    results_sink = sink_class(res_file_name, append=resuming, fields=fields)
+    trace_writer = trace_writer_class(trace_file_name, append=resuming) if report_traces else None
+    hypotheses = HypothesisLog(hypotheses_path, append=resuming) if hypothesis_log else None
+    if hypotheses is not None and hypotheses_state is not None:
+        hypotheses.restore(hypotheses_state, learner)
+    catalogue_writer = CatalogueWriter(
+        os.path.join(results_path, CATALOGUE_NAME), name, config, os.path.basename(res_file_name),
+        os.path.basename(trace_file_name) if report_traces else None, fresh=not resuming,
+    ) if catalogue else None
+    def save_checkpoint(n: int, rep: int) -> None:
+        if not sink_class.resumable:
+            return
+        results_sink.flush()
+        if trace_writer is not None:
+            trace_writer.flush()
+        if hypotheses is not None:
+            hypotheses.flush()
+        if catalogue_writer is not None:
+            catalogue_writer.flush()
+        Checkpoint(
+            config, n, rep, random.getstate(), learner, file_offsets(output_files), accumulator, cell_metrics, monitor.cells,
+            hypotheses.state(learner) if hypotheses is not None else None, cell_timing,
+        ).save(checkpoint_path)
+    status_width = 0
+    tests_run = 0
+    for n in range(start_n, N + 1):
+        for i in range(start_rep if n == start_n else 0, reps):
+            if i == 0:
+                accumulator = Welford()
+                if long_memory == "n":
+                    learner = learner_class() if memory == "y" else None
+            if tests_run > 0 and (i == 0 or tests_run % checkpoint_every == 0):
+                save_checkpoint(n, i)
+            if verbose:
+                status = monitor.status(n, i)
+                print(status.ljust(status_width), end="\r")
+                status_width = len(status)
+            if corpus is not None and compact:
+                test = generate(n, learner, full_reporting, report_traces, CompactState.from_state(corpus.start_states(n)[i]), CompactState.from_state(corpus.goal_state(n)))
+            elif corpus is not None:
+                test = generate(n, learner, full_reporting, report_traces, corpus.start_states(n)[i], corpus.goal_state(n))
+            else:
+                test = generate(n, learner, full_reporting, report_traces)
+            if timing:
+                test.timer = PhaseTimer()
+            # traces are streamed to the trace writer as they come, rather than kept (as `State`s) until the test ends
+            test.traces = TraceRetention("stream", sink=trace_writer) if trace_writer is not None else TraceRetention("none")
+            if trace_writer is not None:
+                trace_writer.begin(n, i)
+            METRICS.enabled = counters
+            METRICS.reset()
+            if memory_stats:
+                tracemalloc.reset_peak()
+                traced_before = tracemalloc.get_traced_memory()[0]
+                reset_peak_rss()
+            profiled = profiler is not None and profiler.wants(n, i)
+            if profiled:
+                profiler.profiler.enable()
+            start_time = time.perf_counter()
+            test.run()
+            wall_time = time.perf_counter() - start_time
+            if profiled:
+                profiler.profiler.disable()
+                profiler.profiled += 1
+            METRICS.enabled = False
+            metrics = METRICS.snapshot() if counters else None
+            if counters:
+                add_cell_metrics(cell_metrics.setdefault(n, { "tests": 0, "counts": {}, "rule_firings": {} }), metrics)
+            pending_traces = trace_writer.pending() if memory_stats and trace_writer is not None else None
+            test_memory = {
+                "hypothesis_bytes": deep_sizeof(test.learner.hypothesis),
+                "traces_bytes": deep_sizeof(test.traces.iterations) + (deep_sizeof(pending_traces) if pending_traces is not None else 0),
+                "test_peak_bytes": tracemalloc.get_traced_memory()[1] - traced_before,
+                "peak_rss_bytes": peak_rss(),
+            } if memory_stats else None
+            tests_run += 1
+            t = test.timer.start()
+            if trace_writer is not None:
+                trace_writer.end()
+            test.timer.stop("io", t)
+            hypothesis_version = hypotheses.version(test.learner) if hypotheses is not None else None
+            record = make_record(config, n, i, test, wall_time, metrics, test_memory, hypothesis_version)
+            t = test.timer.start()
+            results_sink.write(record, test)
+            if timing:
+                cell = cell_timing.setdefault(n, { "tests": 0, "results_io_ns": 0 })
+                cell["tests"] += 1
+                cell["results_io_ns"] += test.timer.start() - t
+            if catalogue_writer is not None:
+                catalogue_writer.write(record)
+            accumulator.add(test._steps)
+            monitor.add(n, test._steps, wall_time)
+            if adaptive is not None and should_stop(accumulator, adaptive):
+                break
+    if tracing:
+        tracemalloc.stop()
+    monitor.save()
+    results_sink.close()
+    if trace_writer is not None:
+        trace_writer.close()
+    if hypotheses is not None:
+        hypotheses.close()
+    if catalogue_writer is not None:
+        catalogue_writer.close()
+    if counters:
+        with open(counters_path, "w") as counters_file:
+            json.dump(cell_metrics, counters_file, indent=2)
+    if timing:
+        with open(timing_path, "w") as timing_file:
+            json.dump(cell_timing, timing_file, indent=2)
+    if profiler is not None and (profile_path := profiler.dump(name)) is not None and verbose:
+        print(f"\nSaved profile at: {profile_path}")
+    if os.path.isfile(checkpoint_path):
+        os.remove(checkpoint_path)
+
+def prompt_config(args: argparse.Namespace) -> dict:
+    """ Builds a sweep configuration from the command line arguments, prompting only for the missing ones. """
+    ask = lambda value, prompt: value if value is not None else input(prompt)
+    algorithm = ask(args.algorithm, "Enter algorithm ({q}uicksort, {b}ubblesort, append {p}artial): ")
+    N = int(ask(args.N, "Enter N: "))
+    reps = int(ask(args.reps, "Enter # of repetitions: "))
+    memory = ask(args.memory, "Remember advice (y/n): ")
     long_memory = "n"
     if memory == "y":
-        long_memory = input("Remember across values of 'n' (y/n): ")
-    full_reporting = input("Report full policies (y/n): ") == "y"
+        long_memory = ask(args.long_memory, "Remember across values of 'n' (y/n): ")
+    full_reporting = ask(args.full_reporting, "Report full policies (y/n): ") == "y"
     report_traces = False
-    if not full_reporting:
-        report_traces = input("Report traces (y/n): ") == "y"
-    res_file_name = os.path.join(RESULTS_PATH, f"{algorithm}_test_N{N}_reps{reps}_mem{memory}_long{long_memory}.txt")
-    trace_file_name = os.path.join(RESULTS_PATH, f"{algorithm}_test_N{N}_reps{reps}_mem{memory}_long{long_memory}.trace")
-    with open(res_file_name, "w") as results_file:
-        results_file.write("")
-    if report_traces:
-        with open(trace_file_name, "w") as trace_file:
-            trace_file.write("")
-    learner: Learner | None = Learner() if long_memory == "y" else None
-    digit_count = lambda n: 1 if n == 0 else int(math.log10(n)) + 1
-    trailing_spaces = " " * digit_count(N)
-    for n in range(1, N + 1):
-        if long_memory == "n":
-            learner = Learner() if memory == "y" else None
-        for i in range(reps):
-            print(f"Running test n={n}, rep={i}", end=f"{trailing_spaces}\r")
-            test = ALGORITHMS[algorithm](n, learner, full_reporting, report_traces)
-            test.run()
-            with open(res_file_name, "a") as results_file:
-                results_file.write(f"{n}; {test}\n")
-            if report_traces:
-                with open(trace_file_name, "a") as trace_file:
-                    trace_file.write(f"{n}; {i}\n{test.get_traces_str()}\n")
+    if not full_reporting and not args.compact:
+        report_traces = ask(args.report_traces, "Report traces (y/n): ") == "y"
+    return {
+        "algorithm": algorithm,
+        "N": N,
+        "reps": reps,
+        "memory": memory,
+        "long_memory": long_memory,
+        "full_reporting": full_reporting,
+        "report_traces": report_traces,
+        "seed": args.seed,
+        "result_format": args.result_format,
+        "trace_format": args.trace_format,
+        "corpus": args.corpus,
+        "timing": args.timing,
+        "counters": args.counters,
+        "memory_stats": args.memory_stats,
+        "compact": args.compact,
+        "hypothesis_log": args.hypothesis_log,
+        "profile": None if args.profile is None else {
+            "mode": args.profile,
+            "cells": parse_cells(args.profile_cells),
+            "interval": args.profile_interval,
+        },
+        "adaptive": None if args.ci_half_width is None else {
+            "min_reps": args.min_reps,
+            "ci_half_width": args.ci_half_width,
+            "confidence": args.confidence,
+            "relative": args.relative,
+        },
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a coaching sweep over n = 1..N.")
+    parser.add_argument("--resume", metavar="CHECKPOINT", nargs="?", const="", default=None,
+                        help="resume an interrupted sweep, either from the given checkpoint file or from the one matching the prompted parameters")
+    parser.add_argument("--checkpoint-every", type=int, default=100, metavar="TESTS",
+                        help="number of tests between two checkpoints (a checkpoint is also taken at the start of each n)")
+    parser.add_argument("--algorithm", choices=ALGORITHMS.keys())
+    parser.add_argument("--N", type=int)
+    parser.add_argument("--reps", type=int)
+    parser.add_argument("--memory", choices=["y", "n"])
+    parser.add_argument("--long-memory", choices=["y", "n"])
+    parser.add_argument("--full-reporting", choices=["y", "n"])
+    parser.add_argument("--report-traces", choices=["y", "n"])
+    parser.add_argument("--seed", type=int, help="seed of `random`; it is also appended to the output filenames")
+    parser.add_argument("--result-format", choices=RESULT_SINKS.keys(), default="txt",
+                        help="format of the results file; `txt` is the legacy `n; steps; start; goal; hypothesis` format")
+    parser.add_argument("--trace-format", choices=TRACE_WRITERS.keys(), default="trace",
+                        help="format of the traces file; `btrace` is a compact binary format (see `traces.py`)")
+    parser.add_argument("--corpus", help="replay start states from this corpus file (see `corpus.py`) instead of shuffling them")
+    parser.add_argument("--ci-half-width", type=float,
+                        help="adaptive repetitions: stop repeating an n once the confidence interval half-width of its mean steps is at most this (then `reps` is the maximum)")
+    parser.add_argument("--min-reps", type=int, default=5, help="adaptive repetitions: minimum repetitions per n")
+    parser.add_argument("--confidence", type=float, default=0.95, help="adaptive repetitions: confidence level")
+    parser.add_argument("--relative", action="store_true", help="adaptive repetitions: the half-width is a fraction of the mean")
+    parser.add_argument("--timing", action="store_true",
+                        help="time the search, oracle, update and I/O phases of each test (requires a structured --result-format)")
+    parser.add_argument("--counters", action="store_true",
+                        help="count states expanded, rule checks, oracle calls, etc. per test and per n (requires a structured --result-format)")
+    parser.add_argument("--compact", action="store_true",
+                        help="large-n mode: run `bp`/`qp` on compact integer states with an indexed learner (no traces; see `api/IndexedLearner.py`)")
+    parser.add_argument("--memory-stats", action="store_true",
+                        help="measure hypothesis and trace sizes, the peak traced memory and the peak RSS of each test (requires a structured --result-format)")
+    parser.add_argument("--hypothesis-log", action="store_true",
+                        help="log hypotheses as diffs in `<name>.hyp` (see `hypotheses.py`), results referring to them by version instead of in full")
+    parser.add_argument("--profile", choices=PROFILERS.keys(), help="profile the tests of --profile-cells (all of them by default)")
+    parser.add_argument("--profile-cells", nargs="*", default=[], metavar="N[:REP]", help="cells to profile, as `n:rep`, or `n` for all repetitions of `n`")
+    parser.add_argument("--profile-interval", type=float, default=0.001, help="sampling interval (seconds) of the `sampling` profiler")
+    parser.add_argument("--progress-every", type=float, default=5.0, metavar="SECONDS", help="refresh period of the `<name>.progress.json` summary")
+    parser.add_argument("--no-catalogue", action="store_true", help=f"do not record the sweep in the results catalogue (`{CATALOGUE_NAME}`, see `catalogue.py`)")
+    args = parser.parse_args()
+    if args.resume is not None and not RESULT_SINKS[args.result_format].resumable:
+        parser.error(f"--resume is not supported with --result-format {args.result_format} (its files cannot be truncated to a checkpoint)")
+    results_path = RESULTS_PATH
+    if args.resume:
+        config = Checkpoint.load(args.resume).config
+        results_path = os.path.dirname(os.path.abspath(args.resume))
+    else:
+        config = prompt_config(args)
+    if args.resume is not None and not os.path.isfile(checkpoint_path := os.path.join(results_path, f"{sweep_name(config)}.ckpt")):
+        parser.error(f"no checkpoint to resume from ({checkpoint_path}); the sweep has either completed or not started")
+    run_sweep(config, results_path, checkpoint_every=args.checkpoint_every, resume=args.resume is not None, progress_every=args.progress_every, catalogue=not args.no_catalogue)
 
 if __name__ == "__main__":
     main()
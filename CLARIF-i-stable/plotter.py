@@ -1,9 +1,13 @@
 # plotter.py
 import os
-from statistics import mean, stdev
+import argparse
 
 import matplotlib.pyplot as plt
 
+from results import summarise_steps
+from progress import load_summary
+from catalogue import Catalogue, CATALOGUE_NAME
+
 def line_as_dict(line: str) -> dict:
     """ Returns just n, steps, start and goal states. """
     line_split = [ x.strip() for x in line.split(";") ]
@@ -14,29 +18,39 @@ def line_as_dict(line: str) -> dict:
         "goal_state": line_split[3],
     }
 
-def line_plot(paths: list[tuple[str]], figname: str, reps: int=100):
+def line_plot(paths: list[tuple[str]], figname: str):
+    """
+    Plots the mean steps (+- std) per `n` of each results file (of any format), however many repetitions each `n` has.
+    Progress files (`<name>.progress.json`, see `progress.py`) may be given as well, to plot sweeps that are still running.
+    """
+    summaries = [ (load_summary(path) if path.endswith(".progress.json") else summarise_steps(path), ) + tuple(t) for path, *t in paths ]
+    summary_plot(summaries, figname)
+
+def config_label(label: str, config: tuple) -> str:
+    """ `label` of a cell, qualified by the `(compact, corpus, seed)` configuration of the summary, if any. """
+    compact, corpus, seed = config
+    details = ([ "compact" ] if compact else []) + ([ f"corpus {corpus}" ] if corpus is not None else []) + ([ f"seed {seed}" ] if seed is not None else [])
+    return f"{label} ({', '.join(details)})" if details else label
+
+def catalogue_plot(catalogue_path: str, cells: list[tuple[str]], figname: str, max_n: int | None = None):
+    """
+    Same as `line_plot`, for the `(algorithm, memory, long_memory)` cells of a results catalogue (over all of their catalogued sweeps),
+    with a line per configuration (see `Catalogue.summarise_steps`) of each cell.
+    """
+    summaries = []
+    with Catalogue(catalogue_path) as catalogue:
+        for algorithm, memory, long_memory, colour, linestyle, label in cells:
+            for config, summary in catalogue.summarise_steps(algorithm, memory, long_memory, max_n).items():
+                summaries.append((summary, colour, linestyle, config_label(label, config)))
+    summary_plot(summaries, figname)
+
+def summary_plot(summaries: list[tuple], figname: str):
+    """ Plots `(summary, colour, linestyle, label)` per-`n` summaries, as returned by `results.summarise_steps`. """
     fig, ax = plt.subplots(figsize=(6,6))
-    for path, colour, linestyle, label in paths:
-        ns = []
-        steps = []
-        one_std_interval = [ [], [] ] # first list: mean - std, second list: mean + std
-        partial_steps = []
-        with open(path, "r") as file:
-            for i, line in enumerate(iter(file.readline, "")):
-                results = line_as_dict(line)
-                partial_steps.append(results["steps"])
-                new_n = results["n"] not in ns
-                if i > 0 and i % reps == reps - 1: # TODO There is surely a more elegant way to handle this...
-                    partial_mean = mean(partial_steps)
-                    steps.append(partial_mean)
-                    partial_std = stdev(partial_steps)
-                    one_std_interval[0].append(partial_mean - partial_std)
-                    one_std_interval[1].append(partial_mean + partial_std)
-                    partial_steps = []
-                    ns.append(results["n"])
-        # print(f"ns: {ns}")
+    for summary, colour, linestyle, label in summaries:
+        ns, steps = summary["n"], summary["mean"]
         ax.plot(ns, steps, color=colour, linestyle=linestyle, label=label)
-        ax.fill_between(ns, *one_std_interval, color=colour, alpha=0.1)
+        ax.fill_between(ns, steps - summary["std"], steps + summary["std"], color=colour, alpha=0.1)
     plt.xticks(ticks=ns)
     plt.xlabel("n")
     plt.ylabel("Coaching Steps")
@@ -51,10 +65,34 @@ def line_plot(paths: list[tuple[str]], figname: str, reps: int=100):
     plt.savefig(fig_path)
 
 def main():
-    reduced = input("Plotting reduced results (y/n): ") == "y"
-    figname = input("Figure filename: ")
-    N = int(input("N: "))
-    reps = int(input("Repetitions: "))
+    parser = argparse.ArgumentParser(description="Plot coaching steps against n; missing arguments are prompted for.")
+    parser.add_argument("--reduced", choices=["y", "n"])
+    parser.add_argument("--figname")
+    parser.add_argument("--N", type=int)
+    parser.add_argument("--reps", type=int)
+    parser.add_argument("--catalogue", nargs="?", const="", default=None,
+                        help=f"plot all catalogued tests with n <= N instead, from this catalogue (`raw_results/{CATALOGUE_NAME}` by default)")
+    args = parser.parse_args()
+    ask = lambda value, prompt: value if value is not None else input(prompt)
+    CWD = os.path.abspath(os.path.dirname(__file__))
+    RESULTS_PATH = os.path.join(CWD, "raw_results")
+    if args.catalogue is not None:
+        figname = ask(args.figname, "Figure filename: ")
+        N = int(ask(args.N, "N: "))
+        cells = [
+            ("bp", "n", "n", "tab:blue", "solid", "Bubble (no mem)"),
+            ("qp", "n", "n", "tab:orange", "solid", "Quick (no mem)"),
+            ("bp", "y", "n", "tab:blue", "dashed", "Bubble (with mem)"),
+            ("qp", "y", "n", "tab:orange", "dashed", "Quick (with mem)"),
+            ("bp", "y", "y", "tab:blue", "dotted", "Bubble (with long mem)"),
+            ("qp", "y", "y", "tab:orange", "dotted", "Quick (with long mem)"),
+        ]
+        catalogue_plot(args.catalogue or os.path.join(RESULTS_PATH, CATALOGUE_NAME), cells, figname, max_n=N)
+        return
+    reduced = ask(args.reduced, "Plotting reduced results (y/n): ") == "y"
+    figname = ask(args.figname, "Figure filename: ")
+    N = int(ask(args.N, "N: "))
+    reps = int(ask(args.reps, "Repetitions: "))
     paths = [
         (f"b_test_N{N}_reps{reps}.txt", "tab:blue", "solid", "Bubble (no mem)"),
         (f"q_test_N{N}_reps{reps}.txt", "tab:orange", "solid", "Quick (no mem)"),
@@ -71,8 +109,6 @@ def main():
         (f"bp_test_N{N}_reps{reps}_memy_longy.txt", "tab:blue", "dotted", "Bubble (with long mem)"),
         (f"qp_test_N{N}_reps{reps}_memy_longy.txt", "tab:orange", "dotted", "Quick (with long mem)"),
     ]
-    CWD = os.path.abspath(os.path.dirname(__file__))
-    RESULTS_PATH = os.path.join(CWD, "raw_results")
     reduced_suffix = ".reduced" if reduced else ""
     paths = [ (os.path.join(RESULTS_PATH, t[0] + reduced_suffix), ) + t[1:] for t in paths ]
     partial_paths = [ (os.path.join(RESULTS_PATH, t[0] + reduced_suffix), ) + t[1:] for t in partial_paths ]
@@ -0,0 +1,162 @@
+# profiling.py
+
+"""
+Profilers for coaching sessions, with a common `enable`/`disable`/`dump` interface:
+- `cprofile`: deterministic profiling (`cProfile`), dumped as a `.pstats` file (see `pstats`, `snakeviz`, etc.),
+  along with a `.collapsed` file derived from its call graph (see `collapse_stats`)
+- `sampling`: low-overhead statistical profiling of the main thread, dumped as a `.collapsed` file of
+  `frame;frame;...;frame count` lines, as read by flame graph tools (`flamegraph.pl`, `speedscope`, etc.)
+"""
+
+import os
+import sys
+import time
+import signal
+import cProfile
+import threading
+from collections import Counter
+
+CWD = os.path.abspath(os.path.dirname(__file__))
+PROFILES_PATH = os.path.join(CWD, "profiles")
+
+class CProfileProfiler:
+    extension: str = "pstats"
+
+    def __init__(self) -> None:
+        self._profile = cProfile.Profile()
+
+    def enable(self) -> None:
+        self._profile.enable()
+
+    def disable(self) -> None:
+        self._profile.disable()
+
+    def dump(self, path: str) -> None:
+        """ Writes `path` (`.pstats`) and the same profile as flame graph stacks next to it (`.collapsed`). """
+        self._profile.dump_stats(path)
+        self._profile.create_stats()
+        write_collapsed(os.path.splitext(path)[0] + ".collapsed", collapse_stats(self._profile.stats))
+
+def frame_name(func: tuple[str, int, str]) -> str:
+    """ Name of a `pstats` function `(filename, line, name)`, as in the stacks of `SamplingProfiler`. """
+    filename, line, name = func
+    return name if filename == "~" else f"{name} ({os.path.basename(filename)}:{line})"
+
+def collapse_stats(stats: dict, unit: float = 1e-6) -> Counter[str]:
+    """
+    Flame graph stacks (weighted by self time, in `unit`s of seconds) derived from the call graph of `cProfile` stats
+    (`{ callee: (cc, nc, tt, ct, { caller: (cc, nc, tt, ct) }) }`): starting from functions that no profiled function called,
+    each call edge gets the share of its callee's time spent through it, split further down in proportion.
+    As `pstats` only keeps caller-callee edges, not whole stacks, a stack's time is an estimate wherever a function has several callers;
+    recursive calls are folded into the outermost one, and stacks under `unit` are dropped.
+    """
+    callees: dict[tuple, list[tuple[tuple, float]]] = {}
+    for callee, (_, _, _, _, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((callee, edge[3]))
+    stacks: Counter[str] = Counter()
+    pending = [ ((func, ), ct) for func, (_, _, _, ct, callers) in stats.items() if not callers ]
+    while pending:
+        path, time = pending.pop()
+        func = path[-1]
+        total = stats[func][3]
+        share = time / total if total > 0 else 0.0
+        weight = round(stats[func][2] * share / unit)
+        if weight > 0:
+            stacks[";".join(map(frame_name, path))] += weight
+        for callee, edge_time in callees.get(func, ()):
+            if callee not in path and edge_time * share >= unit:
+                pending.append((path + (callee, ), edge_time * share))
+    return stacks
+
+def write_collapsed(path: str, stacks: Counter[str]) -> None:
+    with open(path, "w") as file:
+        for stack, count in stacks.most_common():
+            file.write(f"{stack} {count}\n")
+
+class SamplingProfiler:
+    """
+    Samples the main thread's stack every `interval` seconds of CPU time, using `SIGPROF` where available
+    (or every `interval` seconds of wall time, from a background thread, elsewhere).
+    """
+    extension: str = "collapsed"
+
+    def __init__(self, interval: float = 0.001) -> None:
+        self.interval: float = interval
+        self.stacks: Counter[str] = Counter()
+        self._use_signals: bool = hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+        self._previous_handler = None
+        self._thread: threading.Thread | None = None
+        self._running: bool = False
+
+    def _sample(self, frame) -> None:
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        self.stacks[";".join(reversed(frames))] += 1
+
+    def _handle_signal(self, signum, frame) -> None:
+        self._sample(frame)
+
+    def _poll(self, thread_id: int) -> None:
+        while self._running:
+            time.sleep(self.interval)
+            frame = sys._current_frames().get(thread_id)
+            if frame is not None:
+                self._sample(frame)
+
+    def enable(self) -> None:
+        self._running = True
+        if self._use_signals:
+            self._previous_handler = signal.signal(signal.SIGPROF, self._handle_signal)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        else:
+            self._thread = threading.Thread(target=self._poll, args=(threading.get_ident(), ), daemon=True)
+            self._thread.start()
+
+    def disable(self) -> None:
+        self._running = False
+        if self._use_signals:
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+            signal.signal(signal.SIGPROF, self._previous_handler)
+        elif self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def dump(self, path: str) -> None:
+        write_collapsed(path, self.stacks)
+
+PROFILERS = { "cprofile": CProfileProfiler, "sampling": SamplingProfiler }
+
+class CellProfiler:
+    """
+    Profiles the chosen `(n, rep)` cells of a sweep, all of them into the same profile.
+    `cells` holds `(n, rep)` pairs, or plain `n`s (equivalently, `(n, None)`) for all repetitions of `n`; if `cells` is empty, all cells are profiled.
+    """
+
+    def __init__(self, mode: str, cells: list | None = None, interval: float = 0.001) -> None:
+        self.profiler = SamplingProfiler(interval) if mode == "sampling" else PROFILERS[mode]()
+        self.cells: set[tuple[int, int | None]] = { (cell, None) if isinstance(cell, int) else tuple(cell) for cell in cells or [] }
+        self.profiled: int = 0
+
+    def wants(self, n: int, rep: int) -> bool:
+        return not self.cells or (n, rep) in self.cells or (n, None) in self.cells
+
+    def dump(self, name: str, profiles_path: str = PROFILES_PATH) -> str | None:
+        """ Writes the profile as `<name>.<extension>`, unless no cell has been profiled; returns its path. """
+        if self.profiled == 0:
+            return None
+        os.makedirs(profiles_path, exist_ok=True)
+        path = os.path.join(profiles_path, f"{name}.{self.profiler.extension}")
+        self.profiler.dump(path)
+        return path
+
+def parse_cells(cells: list[str]) -> list[tuple[int, int | None]]:
+    """ Parses `n:rep` (a single cell) or `n` (all repetitions of `n`) command line arguments. """
+    parsed = []
+    for cell in cells:
+        n, _, rep = cell.partition(":")
+        parsed.append((int(n), int(rep) if rep else None))
+    return parsed
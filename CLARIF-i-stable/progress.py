@@ -0,0 +1,146 @@
+# progress.py
+
+"""
+Live progress of a sweep: throughput, running statistics per `n` and an ETA, shown on the console and saved as `<name>.progress.json`.
+The summary file is refreshed periodically (and atomically), so it can be watched, or plotted through `plotter.py`, while the sweep runs.
+"""
+
+import os
+import json
+import math
+import time
+
+from stats import Welford
+
+def format_duration(seconds: float) -> str:
+    if not math.isfinite(seconds):
+        return "?"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+class ProgressMonitor:
+    """
+    Tracks a sweep of `reps` tests for each `n` in `1..N`.
+
+    Steps and wall times are accumulated per `n` (Welford). The cost of a test of each `n` that has not been run yet is projected
+    by a power law `a * n^b`, fitted (in log-log space) on the mean wall times of the last `fit_window` values of `n` that have been run,
+    since cost grows steeply with `n`; before two of them have been run, `b` defaults to `default_exponent` (see `scheduler.estimate_cost`).
+    For adaptive sweeps, `reps` is a maximum, hence the ETA is an upper bound.
+
+    Attributes:
+        cells: `n` -> (steps, wall time) accumulators, so far (kept in checkpoints, so that resumed sweeps carry on with them)
+    """
+
+    def __init__(self, name: str, N: int, reps: int, summary_path: str, refresh_every: float = 5.0, default_exponent: float = 3.0, fit_window: int = 5) -> None:
+        self.name: str = name
+        self.N: int = N
+        self.reps: int = reps
+        self.summary_path: str = summary_path
+        self.refresh_every: float = refresh_every
+        self.default_exponent: float = default_exponent
+        self.fit_window: int = fit_window
+        self.cells: dict[int, tuple[Welford, Welford]] = {}
+        self._start_time: float = time.perf_counter()
+        self._last_refresh: float = self._start_time
+        self._tests_run: int = 0 # by this process, for the throughput
+
+    def add(self, n: int, steps: int, wall_time: float) -> None:
+        steps_stats, time_stats = self.cells.setdefault(n, (Welford(), Welford()))
+        steps_stats.add(steps)
+        time_stats.add(wall_time)
+        self._tests_run += 1
+        if time.perf_counter() - self._last_refresh >= self.refresh_every:
+            self.save()
+
+    @property
+    def tests_done(self) -> int:
+        return sum(steps_stats.count for steps_stats, _ in self.cells.values())
+
+    @property
+    def tests_per_second(self) -> float:
+        elapsed = time.perf_counter() - self._start_time
+        return self._tests_run / elapsed if elapsed > 0 else 0.0
+
+    def cost_model(self) -> tuple[float, float] | None:
+        """ `(a, b)` of the projected wall time `a * n^b` of a test, or `None` if no test has been timed yet. """
+        points = [ (math.log(n), math.log(time_stats.mean)) for n, (_, time_stats) in sorted(self.cells.items()) if n > 1 and time_stats.mean > 0 ]
+        points = points[-self.fit_window:]
+        if not points:
+            return None
+        if len(points) == 1:
+            b = self.default_exponent
+        else:
+            mean_x = sum(x for x, _ in points) / len(points)
+            mean_y = sum(y for _, y in points) / len(points)
+            b = sum((x - mean_x) * (y - mean_y) for x, y in points) / sum((x - mean_x) ** 2 for x, _ in points)
+            b = max(b, 0.0)
+        x, y = points[-1]
+        return math.exp(y - b * x), b
+
+    def eta(self) -> float:
+        """ Projected seconds until the sweep completes (`inf` if unknown). """
+        model = self.cost_model()
+        if model is None:
+            return math.inf
+        a, b = model
+        remaining = 0.0
+        for n in range(1, self.N + 1):
+            steps_stats, time_stats = self.cells.get(n, (None, None))
+            done = 0 if steps_stats is None else steps_stats.count
+            if done < self.reps:
+                cost = time_stats.mean if time_stats is not None else a * n ** b
+                remaining += (self.reps - done) * cost
+        return remaining
+
+    def status(self, n: int, rep: int) -> str:
+        """ One-line status of the sweep, as of test `(n, rep)`. """
+        line = f"Running test n={n}, rep={rep} | {self.tests_per_second:.1f} tests/s"
+        if n in self.cells:
+            steps_stats = self.cells[n][0]
+            line += f" | steps {steps_stats.mean:.1f} ± {steps_stats.std:.1f}"
+        return line + f" | ETA {format_duration(self.eta())}"
+
+    def summary(self) -> dict:
+        model = self.cost_model()
+        return {
+            "name": self.name,
+            "N": self.N,
+            "reps": self.reps,
+            "tests_done": self.tests_done,
+            "tests_total": self.N * self.reps,
+            "tests_per_second": self.tests_per_second,
+            "eta_seconds": None if model is None else self.eta(),
+            "cost_model": None if model is None else { "a": model[0], "b": model[1] },
+            "cells": {
+                n: {
+                    "count": steps_stats.count,
+                    "steps_mean": steps_stats.mean,
+                    "steps_std": steps_stats.std,
+                    "time_mean": time_stats.mean,
+                    "time_std": time_stats.std,
+                }
+                for n, (steps_stats, time_stats) in sorted(self.cells.items())
+            },
+        }
+
+    def save(self) -> None:
+        """ Writes the summary atomically, so that watchers never read a half-written one. """
+        tmp_path = self.summary_path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self.summary(), file, indent=2)
+        os.replace(tmp_path, self.summary_path)
+        self._last_refresh = time.perf_counter()
+
+def load_summary(path: str) -> dict:
+    """ Per-`n` summary (`n`, `count`, `mean` and `std` of steps, as `results.summarise_steps`) of a (possibly still running) sweep's progress file. """
+    import numpy as np
+    with open(path, "r") as file:
+        cells = json.load(file)["cells"]
+    ns = sorted(cells, key=int)
+    return {
+        "n": np.array([ int(n) for n in ns ], dtype=int),
+        "count": np.array([ cells[n]["count"] for n in ns ], dtype=int),
+        "mean": np.array([ cells[n]["steps_mean"] for n in ns ], dtype=float),
+        "std": np.array([ cells[n]["steps_std"] for n in ns ], dtype=float),
+    }
@@ -1,25 +1,83 @@
 # res_reduce.py
 
+"""
+Reduces legacy (`.txt`) results to their `n; steps` columns, as `<file>.txt.reduced` (with `s; g; p` placeholders, as in non-full reports).
+Files are streamed through one buffered writer each, in parallel, and skipped if their reduced output is newer than them.
+Optionally, a binary columnar summary (`n`, `rep` and `steps` NumPy arrays) is also saved as `<file>.txt.reduced.npz`.
+
+Usage: python res_reduce.py [<results path>] [--workers W] [--force] [--summary]
+"""
+
 import os
+import argparse
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+CWD = os.path.abspath(os.path.dirname(__file__))
+RESULTS_PATH = os.path.join(CWD, "raw_results")
+BUFFER_SIZE = 1 << 20
+
+def is_up_to_date(path: str, output_path: str) -> bool:
+    return os.path.isfile(output_path) and os.path.getmtime(output_path) >= os.path.getmtime(path)
+
+def reduce_file(path: str, summary: bool = False) -> tuple[str, int]:
+    """
+    Reduces the results file at `path` (as bytes, without decoding the, possibly long, reported hypotheses).
+    The output is written to a temporary file that replaces the reduced file once complete, so that an interrupted reduction is never taken as up to date.
+    Malformed lines (e.g., the NUL padding that interrupted runs may leave behind) are skipped.
+    Returns the reduced file's path along with the number of skipped lines.
+    """
+    output_path = path + ".reduced"
+    tmp_path = output_path + ".tmp"
+    ns, reps, steps = array("i"), array("i"), array("i")
+    rep_counts: dict[int, int] = {}
+    skipped = 0
+    with open(path, "rb", buffering=BUFFER_SIZE) as file, open(tmp_path, "wb", buffering=BUFFER_SIZE) as reduced_file:
+        for line in file:
+            fields = line.split(b"; ", 2)
+            if len(fields) < 3 or not fields[0].isdigit() or not fields[1].isdigit():
+                skipped += 1
+                continue
+            n, step_count, _ = fields
+            reduced_file.write(b"%s; %s; s; g; p\n" % (n, step_count))
+            if summary:
+                n = int(n)
+                ns.append(n)
+                steps.append(int(step_count))
+                reps.append(rep_counts.get(n, 0))
+                rep_counts[n] = reps[-1] + 1
+    os.replace(tmp_path, output_path)
+    if summary:
+        import numpy as np
+        with open(output_path + ".npz", "wb") as summary_file: # `np.savez` would append `.npz` to a path
+            np.savez(summary_file, n=np.frombuffer(ns, dtype=np.int32), rep=np.frombuffer(reps, dtype=np.int32), steps=np.frombuffer(steps, dtype=np.int32))
+    return output_path, skipped
 
-def reduce_line(line: str) -> str:
-    n, steps, _, _, _ = line.split("; ")
-    return "; ".join([n, steps, "s", "g", "p"])
+def reduce_all(results_path: str = RESULTS_PATH, workers: int | None = None, force: bool = False, summary: bool = False) -> list[str]:
+    """ Reduces all legacy results files of `results_path` whose reduced output (or summary) is missing or stale; returns the reduced files' paths. """
+    paths = [ os.path.join(results_path, filename) for filename in sorted(os.listdir(results_path)) if filename.endswith(".txt") ]
+    stale = [
+        path for path in paths
+        if force or not is_up_to_date(path, path + ".reduced") or (summary and not is_up_to_date(path, path + ".reduced.npz"))
+    ]
+    print(f"{len(stale)} of {len(paths)} file(s) to reduce")
+    if workers == 1:
+        reduced = [ reduce_file(path, summary) for path in stale ]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            reduced = list(executor.map(reduce_file, stale, [summary] * len(stale)))
+    for path, skipped in reduced:
+        print(f"Reduced: {os.path.basename(path)}" + (f" (skipped {skipped} malformed line(s))" if skipped else ""))
+    return [ path for path, _ in reduced ]
 
 def main():
-    CWD = os.path.abspath(os.path.dirname(__file__))
-    RESULTS_PATH = os.path.join(CWD, "raw_results")
-    filenames = filter(lambda f: f.endswith(".txt"), os.listdir(RESULTS_PATH))
-    for filename in filenames:
-        new_filename = filename + ".reduced"
-        file_path = os.path.join(RESULTS_PATH, filename)
-        new_file_path = os.path.join(RESULTS_PATH, new_filename)
-        with open(new_file_path, "w") as new_file:
-            new_file.write("")
-        with open(file_path, "r") as file:
-            for line in file:
-                with open(new_file_path, "a") as new_file:
-                    new_file.write(f"{reduce_line(line)}\n")
+    parser = argparse.ArgumentParser(description="Reduce legacy results files to their `n; steps` columns.")
+    parser.add_argument("results_path", nargs="?", default=RESULTS_PATH)
+    parser.add_argument("--workers", type=int, help="number of files to reduce in parallel (all CPUs by default)")
+    parser.add_argument("--force", action="store_true", help="reduce files even if their reduced output is up to date")
+    parser.add_argument("--summary", action="store_true", help="also save an `n`/`rep`/`steps` NumPy summary (`.reduced.npz`) of each file")
+    args = parser.parse_args()
+    reduce_all(args.results_path, args.workers, args.force, args.summary)
 
 if __name__ == "__main__":
     main()
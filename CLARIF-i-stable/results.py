@@ -0,0 +1,259 @@
+# results.py
+
+import os
+import re
+import csv
+import json
+import hashlib
+from abc import ABC, abstractmethod
+
+from api.TestCase import TestCase
+
+CWD = os.path.abspath(os.path.dirname(__file__))
+SUMMARIES_PATH = os.path.join(CWD, ".cache", "summaries")
+LEGACY_LINE = re.compile(r"^(\d+); (\d+);", re.MULTILINE) # `n; steps; ...` (lines that do not match, e.g., NUL padding, are skipped)
+
+# Typed columns of structured (non-legacy) results; `seed` is -1 for unseeded sweeps.
+RESULT_FIELDS: dict[str, type] = {
+    "algorithm": str,
+    "n": int,
+    "rep": int,
+    "seed": int,
+    "steps": int,
+    "wall_time": float,
+    "hypothesis_size": int,
+}
+
+# Per-phase wall-clock times (ns) of timed sweeps (see `api.Metrics.PhaseTimer`); `io_ns` covers the trace output of a test.
+# Writing a test's own record cannot be timed within it, so results output is summed per `n` in `<name>.timing.json` instead (see `main.run_sweep`).
+TIMING_FIELDS: dict[str, type] = {
+    "search_ns": int,
+    "oracle_ns": int,
+    "update_ns": int,
+    "io_ns": int,
+}
+
+# Deterministic work counters of counted sweeps (see `api.Metrics.MetricsRegistry`); `rule_firings` is the total over all rules.
+COUNTER_FIELDS: dict[str, type] = {
+    "states_expanded": int,
+    "rule_checks": int,
+    "top_rule_calls": int,
+    "rule_firings": int,
+    "oracle_calls": int,
+    "deepcopies": int,
+}
+
+# Memory usage of memory-instrumented sweeps: the (deep) sizes of the learner's hypothesis and of the traces held in memory at the end of the test
+# (those kept by its `api.TraceRetention` and those its trace writer has yet to write out), the peak of `tracemalloc`-traced memory during the test
+# over the traced memory before it, and the peak RSS during the test (on Linux; elsewhere, the peak RSS of the sweep so far, see `api.Metrics.peak_rss`).
+MEMORY_FIELDS: dict[str, type] = {
+    "hypothesis_bytes": int,
+    "traces_bytes": int,
+    "test_peak_bytes": int,
+    "peak_rss_bytes": int,
+}
+
+# Version of the learner's hypothesis after each test, in the sweep's hypothesis log (see `hypotheses.HypothesisLog`), if kept.
+HYPOTHESIS_FIELDS: dict[str, type] = {
+    "hypothesis_version": int,
+}
+
+def make_record(config: dict, n: int, rep: int, test: TestCase, wall_time: float, metrics: dict | None = None, memory_stats: dict | None = None, hypothesis_version: int | None = None) -> dict:
+    """
+    `metrics` is a `MetricsRegistry.snapshot` of the test, if it has been counted, `memory_stats` its `MEMORY_FIELDS`, if measured,
+    and `hypothesis_version` the version of its hypothesis in the sweep's hypothesis log, if kept.
+    """
+    counters = {} if metrics is None else { name: sum(metrics["rule_firings"].values()) if name == "rule_firings" else metrics["counts"].get(name, 0) for name in COUNTER_FIELDS }
+    timings = { f"{phase}_ns": test.timer.get(phase) for phase in ("search", "oracle", "update", "io") } if test.timer.enabled else {}
+    return {
+        "algorithm": config["algorithm"],
+        "n": n,
+        "rep": rep,
+        "seed": config["seed"] if config.get("seed") is not None else -1,
+        "steps": test._steps,
+        "wall_time": wall_time,
+        "hypothesis_size": len(test.learner.hypothesis),
+    } | timings | counters | (memory_stats or {}) | ({} if hypothesis_version is None else { "hypothesis_version": hypothesis_version })
+
+class ResultSink(ABC):
+    """
+    Buffered writer of per-test results; records are serialised as soon as they are written (i.e., before a shared learner changes),
+    kept in memory and written to the file `buffer_size` at a time. Subclasses implement a specific format.
+    """
+    extension: str = ""
+    resumable: bool = True # whether the output can be truncated to a previous size (see `checkpoint.Checkpoint`)
+    structured: bool = True # whether records are written as typed `fields`
+
+    def __init__(self, path: str, append: bool = False, buffer_size: int = 1000, fields: dict[str, type] = RESULT_FIELDS) -> None:
+        self.path: str = path
+        self.fields: dict[str, type] = fields
+        self.buffer_size: int = buffer_size
+        self._buffer: list = []
+        self._fresh: bool = True # whether the file was empty when opened
+        self._file = self._open(path, append)
+
+    def write(self, record: dict, test: TestCase) -> None:
+        self._buffer.append(self._serialise(record, test))
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._buffer:
+            self._write_buffer(self._buffer)
+            self._buffer = []
+        self._file.flush()
+
+    def close(self) -> None:
+        self.flush()
+        self._file.close()
+
+    def _open(self, path: str, append: bool):
+        file = open(path, "a" if append else "w", newline="")
+        self._fresh = file.tell() == 0
+        return file
+
+    @abstractmethod
+    def _serialise(self, record: dict, test: TestCase):
+        """ The buffered form of a record, as written out by `_write_buffer`. """
+
+    def _write_buffer(self, buffer: list) -> None:
+        self._file.write("".join(buffer))
+
+    def __enter__(self) -> "ResultSink":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+class TextResultSink(ResultSink):
+    """
+    Legacy `n; steps; start; goal; hypothesis` lines, as read by `res_reduce.py` and `plotter.py`;
+    if the sweep keeps a hypothesis log, the hypothesis is referred to by its version, as `@v<id>`.
+    """
+    extension = "txt"
+    structured = False
+
+    def _serialise(self, record: dict, test: TestCase) -> str:
+        if "hypothesis_version" not in record:
+            return f"{record['n']}; {test}\n"
+        start, goal = (test.start_state, test.goal_state) if test.full_reporting else ("s", "g")
+        return f"{record['n']}; {test._steps}; {start}; {goal}; @v{record['hypothesis_version']}\n"
+
+class CSVResultSink(ResultSink):
+    extension = "csv"
+
+    def _serialise(self, record: dict, test: TestCase) -> dict:
+        return record
+
+    def _write_buffer(self, buffer: list[dict]) -> None:
+        writer = csv.DictWriter(self._file, fieldnames=self.fields.keys())
+        if self._fresh:
+            writer.writeheader()
+            self._fresh = False
+        writer.writerows(buffer)
+
+class JSONLResultSink(ResultSink):
+    extension = "jsonl"
+
+    def _serialise(self, record: dict, test: TestCase) -> str:
+        return json.dumps(record) + "\n"
+
+class ParquetResultSink(ResultSink):
+    """ Requires `pyarrow`; each flush is written as a separate row group, and the file is only valid once closed. """
+    extension = "parquet"
+    resumable = False
+
+    def __init__(self, path: str, append: bool = False, buffer_size: int = 1000, fields: dict[str, type] = RESULT_FIELDS) -> None:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Parquet results require `pyarrow` (`pip install pyarrow`)") from e
+        self._pa, self._pq = pa, pq
+        types = { str: pa.string(), int: pa.int64(), float: pa.float64() }
+        self._schema = pa.schema([ (name, types[t]) for name, t in fields.items() ])
+        super().__init__(path, append, buffer_size, fields)
+
+    def _open(self, path: str, append: bool):
+        if append:
+            raise ValueError("Parquet results cannot be appended to")
+        return self._pq.ParquetWriter(path, self._schema)
+
+    def _serialise(self, record: dict, test: TestCase) -> dict:
+        return record
+
+    def _write_buffer(self, buffer: list[dict]) -> None:
+        self._file.write_table(self._pa.Table.from_pylist(buffer, schema=self._schema))
+
+    def flush(self) -> None:
+        if self._buffer:
+            self._write_buffer(self._buffer)
+            self._buffer = []
+
+RESULT_SINKS: dict[str, type[ResultSink]] = { sink.extension: sink for sink in (TextResultSink, CSVResultSink, JSONLResultSink, ParquetResultSink) }
+
+def load_results(path: str) -> dict:
+    """
+    Loads a results file of any format as a dict of NumPy column arrays.
+    Legacy text results (and their `res_reduce.py` summaries) only provide the `n`, `rep` and `steps` columns; `rep` counts the lines of each `n`.
+    """
+    import numpy as np
+    extension = os.path.splitext(path.removesuffix(".reduced"))[1][1:]
+    if extension == "csv":
+        table = np.genfromtxt(path, delimiter=",", names=True, dtype=None, encoding="utf-8", ndmin=1)
+        return { name: table[name] for name in table.dtype.names }
+    if extension == "parquet":
+        import pyarrow.parquet as pq
+        table = pq.read_table(path)
+        return { name: table.column(name).to_numpy() for name in table.column_names }
+    if extension == "jsonl":
+        with open(path, "r") as file:
+            records = [ json.loads(line) for line in file ]
+        fields = RESULT_FIELDS | TIMING_FIELDS | COUNTER_FIELDS | MEMORY_FIELDS | HYPOTHESIS_FIELDS
+        names = records[0].keys() if records else RESULT_FIELDS.keys()
+        return { name: np.array([ record[name] for record in records ], dtype=fields.get(name, object) if fields.get(name) != str else object) for name in names }
+    if extension == "npz": # see `res_reduce.py`
+        with np.load(path) as summary:
+            return { name: summary[name] for name in summary.files }
+    table = np.fromregex(path, LEGACY_LINE, dtype=[("n", int), ("steps", int)])
+    ns, steps = table["n"], table["steps"]
+    # `rep` is the occurrence of each `n` so far (a stable sort groups the lines of each `n`, in file order)
+    order = np.argsort(ns, kind="stable")
+    starts = np.flatnonzero(np.r_[True, np.diff(ns[order]) != 0])
+    reps = np.empty_like(ns)
+    reps[order] = np.arange(len(ns)) - np.repeat(starts, np.diff(np.r_[starts, len(ns)]))
+    return { "n": ns, "rep": reps, "steps": steps }
+
+def summarise_steps(path: str, summaries_path: str = SUMMARIES_PATH) -> dict:
+    """
+    Per-`n` summary (`n`, `count`, `mean` and (sample) `std` of steps) of a results file of any format, grouped by `n` regardless of
+    how many repetitions each `n` has (or in which order they were appended). Summaries are cached as `.npz` files under `summaries_path`,
+    keyed by the file's absolute path, and reused for as long as the file's modification time and size remain the same.
+    """
+    import numpy as np
+    stat = os.stat(path)
+    cache_path = os.path.join(summaries_path, hashlib.sha1(os.path.abspath(path).encode()).hexdigest() + ".npz")
+    if os.path.isfile(cache_path):
+        with np.load(cache_path) as cached:
+            if cached["mtime_ns"] == stat.st_mtime_ns and cached["size"] == stat.st_size:
+                return { name: cached[name] for name in ("n", "count", "mean", "std") }
+    results = load_results(path)
+    ns, inverse, counts = np.unique(results["n"], return_inverse=True, return_counts=True)
+    steps = results["steps"].astype(float)
+    means = np.bincount(inverse, weights=steps) / counts
+    squares = np.bincount(inverse, weights=(steps - means[inverse]) ** 2)
+    stds = np.sqrt(np.divide(squares, counts - 1, out=np.zeros_like(squares), where=counts > 1))
+    summary = { "n": ns, "count": counts, "mean": means, "std": stds }
+    os.makedirs(summaries_path, exist_ok=True)
+    with open(cache_path, "wb") as cache_file:
+        np.savez(cache_file, mtime_ns=stat.st_mtime_ns, size=stat.st_size, **summary)
+    return summary
+
+def count_results(path: str) -> int:
+    """ Number of records in a results file (without loading them). """
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).metadata.num_rows
+    with open(path, "rb") as file:
+        line_count = sum(1 for _ in file)
+    return line_count - 1 if path.endswith(".csv") and line_count > 0 else line_count
@@ -0,0 +1,147 @@
+# scheduler.py
+
+import os
+import sys
+import json
+import tomllib
+import argparse
+import itertools as it
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from main import RESULTS_PATH, ALGORITHMS, COMPACT_ALGORITHMS, sweep_name, run_sweep
+from results import RESULT_SINKS, count_results, load_results
+from traces import TRACE_WRITERS
+
+# Grid axes of a sweep specification, along with their default values; any of them may be given either as a single value or as a list of values.
+SPEC_AXES = {
+    "algorithm": list(ALGORITHMS.keys()),
+    "N": [20],
+    "reps": [100],
+    "memory": ["n", "y"],
+    "long_memory": ["n", "y"],
+    "seeds": [None],
+    "full_reporting": [False],
+    "report_traces": [False],
+    "result_format": ["txt"],
+    "trace_format": ["trace"],
+    "corpus": [None],
+    "timing": [False],
+    "counters": [False],
+    "memory_stats": [False],
+    "compact": [False],
+    "hypothesis_log": [False],
+    "profile": [None], # e.g., { mode = "sampling", cells = [[40, 0], 30] }
+    "adaptive": [None], # e.g., { min_reps = 5, ci_half_width = 0.05, relative = true }
+}
+
+# Rough relative cost of a single coaching session per algorithm; full-state rules are considerably more expensive than partial ones.
+ALGORITHM_COST = { "b": 4.0, "q": 4.0, "bp": 1.0, "qp": 1.0 }
+
+def load_spec(path: str) -> dict:
+    """ Loads a sweep specification from a TOML or a JSON file. """
+    if path.endswith(".toml"):
+        with open(path, "rb") as file:
+            return tomllib.load(file)
+    with open(path, "r") as file:
+        return json.load(file)
+
+def expand_spec(spec: dict) -> list[dict]:
+    """ Expands a sweep specification to the list of sweep configurations (jobs) it describes, as accepted by `main.run_sweep`. """
+    unknown = set(spec.keys()) - set(SPEC_AXES.keys())
+    if unknown:
+        raise ValueError(f"Unknown sweep specification keys: {', '.join(sorted(unknown))}")
+    axes = { key: spec.get(key, default) for key, default in SPEC_AXES.items() }
+    axes = { key: values if isinstance(values, list) else [values] for key, values in axes.items() }
+    configs = []
+    for values in it.product(*axes.values()):
+        config = dict(zip(axes.keys(), values))
+        config["seed"] = config.pop("seeds")
+        if config["algorithm"] not in ALGORITHMS:
+            raise ValueError(f"Unknown algorithm: {config['algorithm']}")
+        if config["compact"] and config["algorithm"] not in COMPACT_ALGORITHMS:
+            raise ValueError(f"Algorithm `{config['algorithm']}` is not supported by the large-n engine")
+        if config["result_format"] not in RESULT_SINKS:
+            raise ValueError(f"Unknown result format: {config['result_format']}")
+        if config["trace_format"] not in TRACE_WRITERS:
+            raise ValueError(f"Unknown trace format: {config['trace_format']}")
+        if config["memory"] == "n":
+            config["long_memory"] = "n" # long memory makes no sense without memory
+        if config["full_reporting"] or config["compact"]:
+            config["report_traces"] = False # same as `main.prompt_config`; the large-n engine does not report traces
+        if config not in configs:
+            configs.append(config)
+    return configs
+
+def estimate_cost(config: dict) -> float:
+    """
+    Estimates the relative cost of a sweep, assuming that a session at size `n` costs about `n ** 3`
+    (`O(n ** 2)` coaching steps, each one searching with a hypothesis that grows with `n`), or `n ** 2` on the large-n engine.
+    """
+    per_rep = sum(n ** (2 if config["compact"] else 3) for n in range(1, config["N"] + 1))
+    if config["memory"] == "y":
+        per_rep *= 2 if config["long_memory"] == "y" else 1.5 # larger hypotheses, longer searches
+    if config["full_reporting"] or config["report_traces"]:
+        per_rep *= 1.5
+    return ALGORITHM_COST[config["algorithm"]] * config["reps"] * per_rep
+
+def is_complete(config: dict, results_path: str = RESULTS_PATH) -> bool:
+    """
+    A sweep is complete if it has no pending checkpoint and its results file holds all `N * reps` records
+    (for adaptive sweeps, at least `min_reps` records of `n = N`, since the number of repetitions varies).
+    """
+    name = sweep_name(config)
+    res_file_name = os.path.join(results_path, f"{name}.{RESULT_SINKS[config['result_format']].extension}")
+    if os.path.isfile(os.path.join(results_path, f"{name}.ckpt")) or not os.path.isfile(res_file_name):
+        return False
+    if config["adaptive"] is not None:
+        ns = load_results(res_file_name)["n"]
+        return (ns == config["N"]).sum() >= min(config["adaptive"].get("min_reps", 2), config["reps"])
+    return count_results(res_file_name) == config["N"] * config["reps"]
+
+def plan(spec: dict, results_path: str = RESULTS_PATH) -> list[dict]:
+    """ Returns the jobs of `spec` that are not complete yet, most expensive first. """
+    jobs = [ config for config in expand_spec(spec) if not is_complete(config, results_path) ]
+    return sorted(jobs, key=estimate_cost, reverse=True)
+
+def run_job(config: dict, results_path: str, checkpoint_every: int, verbose: bool) -> str:
+    resume = os.path.isfile(os.path.join(results_path, f"{sweep_name(config)}.ckpt")) # otherwise, the job starts (over) from scratch
+    run_sweep(config, results_path, checkpoint_every=checkpoint_every, resume=resume, verbose=verbose)
+    return sweep_name(config)
+
+def schedule(spec: dict, results_path: str = RESULTS_PATH, workers: int = 1, checkpoint_every: int = 100) -> None:
+    """
+    Runs all incomplete jobs of `spec`, resuming the ones that have been interrupted.
+    Jobs are submitted most expensive first, so that the long ones start first and short ones fill in the gaps.
+    """
+    jobs = plan(spec, results_path)
+    print(f"{len(jobs)} job(s) to run")
+    if workers == 1:
+        for config in jobs:
+            print(f"Running {sweep_name(config)}")
+            run_job(config, results_path, checkpoint_every, True)
+            print()
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [ executor.submit(run_job, config, results_path, checkpoint_every, False) for config in jobs ]
+        for done_count, future in enumerate(as_completed(futures), start=1):
+            print(f"[{done_count}/{len(jobs)}] Finished {future.result()}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run all (incomplete) sweeps of a TOML or JSON sweep specification.")
+    parser.add_argument("spec", help="path to the sweep specification")
+    parser.add_argument("--workers", type=int, default=1, help="number of sweeps to run in parallel")
+    parser.add_argument("--checkpoint-every", type=int, default=100, metavar="TESTS")
+    parser.add_argument("--results-path", default=RESULTS_PATH)
+    parser.add_argument("--dry-run", action="store_true", help="only list the jobs to run, in order, along with their estimated costs")
+    args = parser.parse_args()
+    spec = load_spec(args.spec)
+    if not os.path.isdir(args.results_path):
+        os.makedirs(args.results_path)
+    if args.dry_run:
+        for config in plan(spec, args.results_path):
+            print(f"{sweep_name(config)}: {estimate_cost(config):.3g}")
+        sys.exit(0)
+    schedule(spec, args.results_path, args.workers, args.checkpoint_every)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# stats.py
+
+import math
+from functools import lru_cache
+
+class Welford:
+    """ Running mean and (sample) variance, updated in O(1) per value (Welford's algorithm). """
+
+    def __init__(self) -> None:
+        self.count: int = 0
+        self.mean: float = 0.0
+        self._m2: float = 0.0
+
+    def add(self, x: float) -> None:
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+
+    @property
+    def variance(self) -> float:
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+    def half_width(self, confidence: float = 0.95) -> float:
+        """ Half-width of the (Student's t) confidence interval of the mean; infinite for fewer than 2 values. """
+        if self.count < 2:
+            return math.inf
+        t = t_quantile((1 + confidence) / 2, self.count - 1)
+        return t * self.std / math.sqrt(self.count)
+
+def regularized_beta(a: float, b: float, x: float) -> float:
+    """ Regularized incomplete beta function `I_x(a, b)`, through its continued fraction (modified Lentz's method). """
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    if x > (a + 1) / (a + b + 2): # the fraction converges fast below this point only
+        return 1.0 - regularized_beta(b, a, 1.0 - x)
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log1p(-x)) / a
+    tiny = 1e-300
+    c, d = 1.0, 1.0 - (a + b) * x / (a + 1)
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    f = d
+    for m in range(1, 300):
+        for numerator in (m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)), -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))):
+            d = 1.0 + numerator * d
+            d = 1.0 / (d if abs(d) > tiny else tiny)
+            c = 1.0 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            f *= c * d
+        if abs(c * d - 1.0) < 1e-15:
+            break
+    return front * f
+
+def t_cdf(t: float, df: int) -> float:
+    """ Cumulative distribution function of Student's t distribution with `df` degrees of freedom. """
+    tail = regularized_beta(df / 2, 0.5, df / (df + t * t)) / 2
+    return 1.0 - tail if t > 0 else tail
+
+@lru_cache(maxsize=None)
+def t_quantile(p: float, df: int) -> float:
+    """ Quantile of Student's t distribution with `df` degrees of freedom, for `p` in `[0.5, 1)`, by bisection on `t_cdf`. """
+    low, high = 0.0, 1.0
+    while t_cdf(high, df) < p:
+        low, high = high, 2 * high
+    for _ in range(100):
+        middle = (low + high) / 2
+        if t_cdf(middle, df) < p:
+            low = middle
+        else:
+            high = middle
+        if high - low <= 1e-12 * high:
+            break
+    return (low + high) / 2
+
+def should_stop(accumulator: Welford, adaptive: dict) -> bool:
+    """
+    Sequential stopping rule of adaptive sweeps: stop repeating once at least `min_reps` values have been seen
+    and the confidence interval half-width is at most `ci_half_width` (as a fraction of the mean, if `relative`).
+    """
+    if accumulator.count < adaptive.get("min_reps", 2):
+        return False
+    target = adaptive["ci_half_width"]
+    if adaptive.get("relative", False):
+        target *= abs(accumulator.mean)
+    return accumulator.half_width(adaptive.get("confidence", 0.95)) <= target
@@ -0,0 +1,38 @@
+# tests/test_indexed_learner.py
+
+"""
+The large-n engine (`COMPACT_ALGORITHMS`, over an `IndexedLearner`) must take exactly as many coaching steps
+as the reference one (`ALGORITHMS`, over a `Learner`), from the same random start states, be the learner shared across tests or not.
+"""
+
+import os
+import sys
+import random
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import ALGORITHMS, COMPACT_ALGORITHMS
+from api.Learner import Learner
+from api.IndexedLearner import IndexedLearner
+
+REPS = 5
+
+def steps(generate, n: int, learner, seed: int) -> list[int]:
+    random.seed(seed)
+    result = []
+    for _ in range(REPS):
+        test = generate(n, learner, False, False)
+        test.run()
+        result.append(test._steps)
+    return result
+
+@pytest.mark.parametrize("algorithm", sorted(COMPACT_ALGORITHMS))
+@pytest.mark.parametrize("n", [2, 3, 5, 8, 12])
+@pytest.mark.parametrize("shared", [False, True])
+def test_compact_engine_matches_reference(algorithm: str, n: int, shared: bool) -> None:
+    for seed in range(3):
+        reference = steps(ALGORITHMS[algorithm], n, Learner() if shared else None, seed)
+        compact = steps(COMPACT_ALGORITHMS[algorithm], n, IndexedLearner() if shared else None, seed)
+        assert compact == reference
@@ -0,0 +1,404 @@
+# traces.py
+
+"""
+Learner trace files, as written by `main.py` when reporting traces.
+
+Text traces (`.trace`) hold, for each test `(n, i)`, a `n; i` header line followed by one line per coaching iteration,
+each line listing all states the learner passed through as `k0=1,k1=3,...`, separated by `; `.
+
+Binary traces (`.btrace`) hold the same information, as follows (all integers little-endian):
+    file header:      MAGIC
+    block header:     n, i, iteration count (uint32 each), value width in bytes (uint8, 2 or 4)
+    each iteration:   state count (uint32), the first state as a packed array of `n` values,
+                      then each subsequent state as the two (packed) indices swapped since the previous state;
+                      a pair with equal indices repeats the previous state, while a pair starting with `SENTINEL`
+                      is followed by a full packed state (for transitions that are not single swaps).
+States are stored as their values in sorted key order, i.e., the order of `str(state)`.
+
+Trace stores (`.tstore`) hold the blocks of binary traces, each one compressed separately, along with an index to seek to them:
+    file header:      STORE_MAGIC, codec (uint8, see `CODECS`)
+    each frame:       n, i (uint32 each), compressed length (uint64), compressed block (without `MAGIC`)
+    footer:           index entries of n, i (uint32 each) and frame offset (uint64), one per frame
+    trailer:          entry count, footer offset (uint64 each), STORE_MAGIC
+A store without a valid trailer (e.g., from an interrupted sweep) is still readable; its index is then rebuilt by skipping from frame to frame.
+"""
+
+import os
+import re
+import lzma
+import zlib
+import struct
+from abc import ABC, abstractmethod
+from array import array
+from typing import Iterator
+
+from api.State import State
+
+MAGIC = b"CLTRACE1"
+BLOCK_HEADER = struct.Struct("<IIIB")
+COUNT = struct.Struct("<I")
+TYPECODES = { 2: "H", 4: "I" }
+SENTINEL = { 2: 0xFFFF, 4: 0xFFFFFFFF }
+
+STORE_MAGIC = b"CLTSTOR1"
+STORE_HEADER = struct.Struct(f"<{len(STORE_MAGIC)}sB")
+FRAME_HEADER = struct.Struct("<IIQ")
+INDEX_ENTRY = struct.Struct("<IIQ")
+STORE_TRAILER = struct.Struct(f"<QQ{len(STORE_MAGIC)}s")
+CODECS = { 0: (zlib.compress, zlib.decompress), 1: (lzma.compress, lzma.decompress) }
+CODEC_IDS = { "zlib": 0, "lzma": 1 }
+TEXT_VALUE = re.compile(rb"=(-?\d+)")
+
+def state_values(state: State) -> list[int]:
+    return [ v for _, v in sorted(state.state.items()) ]
+
+def value_width(n: int) -> int:
+    return 2 if n < SENTINEL[2] else 4
+
+def encode_iteration(states: list[list[int]], width: int) -> bytes:
+    """ Encodes an iteration, given as a list of states (value lists), as its first state followed by swap deltas. """
+    if not states:
+        return COUNT.pack(0)
+    typecode, sentinel = TYPECODES[width], SENTINEL[width]
+    packed = array(typecode, states[0])
+    for previous, current in zip(states[:-1], states[1:]):
+        diff = [ k for k, (a, b) in enumerate(zip(previous, current)) if a != b ]
+        if not diff:
+            packed.extend((0, 0))
+        elif len(diff) == 2 and previous[diff[0]] == current[diff[1]] and previous[diff[1]] == current[diff[0]]:
+            packed.extend(diff)
+        else:
+            packed.extend((sentinel, 0))
+            packed.extend(current)
+    return COUNT.pack(len(states)) + packed.tobytes()
+
+def encode_block(n: int, i: int, iterations: list[list[list[int]]]) -> bytes:
+    """ Encodes the traces of test `(n, i)`, given as lists (iterations) of lists (states) of values. """
+    width = value_width(n)
+    return b"".join([ BLOCK_HEADER.pack(n, i, len(iterations), width) ] + [ encode_iteration(states, width) for states in iterations ])
+
+class TraceWriter(ABC):
+    """
+    Base of trace writers: the traces of a test are either written at once (`write`), or streamed, one iteration at a time,
+    in between `begin` and `end` (e.g., through an `api.TraceRetention` in "stream" mode), so that they are never accumulated as `State`s.
+    """
+    extension: str = ""
+
+    def write(self, n: int, i: int, traces: list[list[State]]) -> None:
+        self.begin(n, i)
+        for states in traces:
+            self.write_iteration(states)
+        self.end()
+
+    @abstractmethod
+    def begin(self, n: int, i: int) -> None:
+        """ Starts the traces of test `(n, i)`. """
+
+    @abstractmethod
+    def write_iteration(self, states: list[State]) -> None:
+        """ Writes (or encodes) the states of an iteration of the current test. """
+
+    def end(self) -> None:
+        pass
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def pending(self) -> object:
+        """ What the writer holds of the current test's traces until `end` (e.g., to measure its memory), if anything. """
+        return None
+
+class BlockTraceWriter(TraceWriter):
+    """ Base of binary trace writers: each iteration is delta-encoded as soon as it is streamed, and its test's block is written on `end`. """
+
+    def begin(self, n: int, i: int) -> None:
+        self._key = (n, i)
+        self._width = value_width(n)
+        self._chunks: list[bytes] = []
+
+    def write_iteration(self, states: list[State]) -> None:
+        self._chunks.append(encode_iteration([ state_values(s) for s in states ], self._width))
+
+    def pending(self) -> object:
+        return self._chunks
+
+    def end(self) -> None:
+        n, i = self._key
+        self._write_block(n, i, b"".join([ BLOCK_HEADER.pack(n, i, len(self._chunks), self._width) ] + self._chunks))
+        self._chunks = []
+
+    @abstractmethod
+    def _write_block(self, n: int, i: int, block: bytes) -> None:
+        """ Writes the encoded block of test `(n, i)`. """
+
+def decode_iterations(n: int, iteration_count: int, width: int, data: bytes | memoryview, offset: int = 0) -> tuple[list[list[list[int]]], int]:
+    """ Decodes `iteration_count` iterations starting at `offset` of `data`; returns them along with the offset right after them. """
+    typecode, sentinel = TYPECODES[width], SENTINEL[width]
+    iterations = []
+    for _ in range(iteration_count):
+        (state_count, ) = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        states = []
+        if state_count:
+            current = array(typecode, data[offset:offset + n * width])
+            offset += n * width
+            states.append(current.tolist())
+            for _ in range(state_count - 1):
+                left, right = array(typecode, data[offset:offset + 2 * width])
+                offset += 2 * width
+                if left == sentinel:
+                    current = array(typecode, data[offset:offset + n * width])
+                    offset += n * width
+                elif left != right:
+                    current[left], current[right] = current[right], current[left]
+                states.append(current.tolist())
+        iterations.append(states)
+    return iterations, offset
+
+class BinaryTraceWriter(BlockTraceWriter):
+    """ Writes `.btrace` files. """
+    extension: str = "btrace"
+
+    def __init__(self, path: str, append: bool = False) -> None:
+        self._file = open(path, "ab" if append else "wb")
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+
+    def _write_block(self, n: int, i: int, block: bytes) -> None:
+        self._file.write(block)
+
+class TextTraceWriter(TraceWriter):
+    """ Writes legacy `.trace` files; iterations are written out as soon as they are streamed. """
+    extension: str = "trace"
+
+    def __init__(self, path: str, append: bool = False) -> None:
+        self._file = open(path, "a" if append else "w")
+
+    def begin(self, n: int, i: int) -> None:
+        self._file.write(f"{n}; {i}\n")
+
+    def write_iteration(self, states: list[State]) -> None:
+        self._file.write("; ".join(str(s) for s in states) + "\n")
+
+class TraceStore:
+    """
+    Random access reader of `.tstore` files: opening one only reads its index, and reading a test `(n, i)` only decompresses its block.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._file = open(path, "rb")
+        magic, codec = STORE_HEADER.unpack(self._file.read(STORE_HEADER.size))
+        if magic != STORE_MAGIC:
+            raise ValueError(f"Not a trace store: {path}")
+        self.codec: int = codec
+        self._decompress = CODECS[codec][1]
+        self.index: dict[tuple[int, int], int] = {}
+        self.end: int = self.__load_index()
+
+    def __load_index(self) -> int:
+        """ Loads the index from the footer, or rebuilds it if there is none; returns the offset right after the last frame. """
+        size = self._file.seek(0, os.SEEK_END)
+        if size >= STORE_HEADER.size + STORE_TRAILER.size:
+            self._file.seek(size - STORE_TRAILER.size)
+            count, footer_offset, magic = STORE_TRAILER.unpack(self._file.read(STORE_TRAILER.size))
+            if magic == STORE_MAGIC and footer_offset + count * INDEX_ENTRY.size + STORE_TRAILER.size == size:
+                self._file.seek(footer_offset)
+                footer = self._file.read(count * INDEX_ENTRY.size)
+                for n, i, offset in INDEX_ENTRY.iter_unpack(footer):
+                    self.index[(n, i)] = offset
+                return footer_offset
+        offset = STORE_HEADER.size
+        while offset + FRAME_HEADER.size <= size:
+            self._file.seek(offset)
+            n, i, length = FRAME_HEADER.unpack(self._file.read(FRAME_HEADER.size))
+            if offset + FRAME_HEADER.size + length > size:
+                break # incomplete frame
+            self.index[(n, i)] = offset
+            offset += FRAME_HEADER.size + length
+        return offset
+
+    def keys(self) -> list[tuple[int, int]]:
+        return list(self.index.keys())
+
+    def __contains__(self, key: tuple[int, int]) -> bool:
+        return key in self.index
+
+    def read(self, key: tuple[int, int]) -> list[list[list[int]]]:
+        """ Returns the iterations (lists of states, as value lists) of test `key`. """
+        self._file.seek(self.index[key])
+        _, _, length = FRAME_HEADER.unpack(self._file.read(FRAME_HEADER.size))
+        block = self._decompress(self._file.read(length))
+        n, _, iteration_count, width = BLOCK_HEADER.unpack_from(block)
+        iterations, _ = decode_iterations(n, iteration_count, width, block, BLOCK_HEADER.size)
+        return iterations
+
+    def __iter__(self) -> Iterator[tuple[tuple[int, int], list[list[list[int]]]]]:
+        for key in self.index:
+            yield key, self.read(key)
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "TraceStore":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+class TextTraceIndex:
+    """
+    Lazy reader of the last iteration of each test of `.trace` files: opening one only scans for its header lines (without parsing
+    the states in between) to index the offset of each test's last iteration line; reading a test `(n, i)` then only parses that line.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._file = open(path, "rb")
+        self.index: dict[tuple[int, int], int | None] = {} # offset of the last iteration line, if any
+        key, last, offset = None, None, 0
+        for line in self._file:
+            if b"=" in line:
+                last = offset
+            elif line.strip():
+                if key is not None:
+                    self.index[key] = last
+                key, last = tuple(map(int, line.split(b";"))), None
+            offset += len(line)
+        if key is not None:
+            self.index[key] = last
+
+    def keys(self) -> list[tuple[int, int]]:
+        return list(self.index.keys())
+
+    def __contains__(self, key: tuple[int, int]) -> bool:
+        return key in self.index
+
+    def read_last(self, key: tuple[int, int]) -> list[list[int]]:
+        """ Returns the states (as value lists) of the last iteration of test `key`. """
+        offset = self.index[key]
+        if offset is None:
+            return []
+        self._file.seek(offset)
+        return parse_text_iteration(self._file.readline())
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "TextTraceIndex":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+def parse_text_iteration(line: bytes) -> list[list[int]]:
+    """ Parses an iteration line of a `.trace` file (`k0=1,k1=3,...; ...`) into its states, as value lists. """
+    values = list(map(int, TEXT_VALUE.findall(line)))
+    width = len(values) // (line.count(b";") + 1)
+    return [ values[k:k + width] for k in range(0, len(values), width) ]
+
+class TraceStoreWriter(BlockTraceWriter):
+    """ Writes `.tstore` files. The index is written on `close`. """
+    extension: str = "tstore"
+
+    def __init__(self, path: str, append: bool = False, codec: str = "zlib") -> None:
+        self._index: dict[tuple[int, int], int] = {}
+        if append and os.path.isfile(path) and os.path.getsize(path) > 0:
+            with TraceStore(path) as store:
+                self._index, end, codec_id = store.index, store.end, store.codec
+            self._file = open(path, "r+b")
+            self._file.truncate(end) # drop the footer, to be rewritten on `close`
+            self._file.seek(end)
+        else:
+            codec_id = CODEC_IDS[codec]
+            self._file = open(path, "wb")
+            self._file.write(STORE_HEADER.pack(STORE_MAGIC, codec_id))
+        self._compress = CODECS[codec_id][0]
+
+    def write_block(self, n: int, i: int, iterations: list[list[list[int]]]) -> None:
+        self._write_block(n, i, encode_block(n, i, iterations))
+
+    def _write_block(self, n: int, i: int, block: bytes) -> None:
+        data = self._compress(block)
+        self._index[(n, i)] = self._file.tell()
+        self._file.write(FRAME_HEADER.pack(n, i, len(data)))
+        self._file.write(data)
+
+    def close(self) -> None:
+        footer_offset = self._file.tell()
+        self._file.write(b"".join(INDEX_ENTRY.pack(n, i, offset) for (n, i), offset in self._index.items()))
+        self._file.write(STORE_TRAILER.pack(len(self._index), footer_offset, STORE_MAGIC))
+        self._file.close()
+
+TRACE_WRITERS = { writer.extension: writer for writer in (TextTraceWriter, BinaryTraceWriter, TraceStoreWriter) }
+
+def read_binary_traces(path: str) -> Iterator[tuple[tuple[int, int], list[list[list[int]]]]]:
+    """ Yields `((n, i), iterations)` for each block of a `.btrace` file, where `iterations` are lists of states (value lists). """
+    with open(path, "rb") as file:
+        data = file.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"Not a binary trace file: {path}")
+    offset = len(MAGIC)
+    while offset < len(data):
+        n, i, iteration_count, width = BLOCK_HEADER.unpack_from(data, offset)
+        offset += BLOCK_HEADER.size
+        iterations, offset = decode_iterations(n, iteration_count, width, data, offset)
+        yield (n, i), iterations
+
+def read_text_traces(path: str) -> Iterator[tuple[tuple[int, int], list[list[list[int]]]]]:
+    """ Same as `read_binary_traces` for `.trace` files. """
+    with open(path, "r") as file:
+        key, iterations = None, []
+        for line in file:
+            words = [ x.strip() for x in line.split(";") ]
+            if "=" not in line:
+                if key is not None:
+                    yield key, iterations
+                key, iterations = tuple(map(int, words)), []
+            else:
+                iterations.append([ [ int(w.split("=")[-1]) for w in word.split(",") ] for word in words ])
+        if key is not None:
+            yield key, iterations
+
+def read_traces(path: str) -> Iterator[tuple[tuple[int, int], list[list[list[int]]]]]:
+    """ Yields `((n, i), iterations)` for each test of a trace file of any format. """
+    if path.endswith(".tstore"):
+        with TraceStore(path) as store:
+            yield from store
+    elif path.endswith(".btrace"):
+        yield from read_binary_traces(path)
+    else:
+        yield from read_text_traces(path)
+
+def convert_text_traces(text_path: str, binary_path: str) -> None:
+    """ Converts a `.trace` file to a `.btrace` one. """
+    with open(binary_path, "wb") as file:
+        file.write(MAGIC)
+        for (n, i), iterations in read_text_traces(text_path):
+            file.write(encode_block(n, i, iterations))
+
+def convert_to_store(path: str, store_path: str, codec: str = "zlib") -> None:
+    """ Converts a `.trace` or `.btrace` file to a `.tstore` one. """
+    writer = TraceStoreWriter(store_path, codec=codec)
+    for (n, i), iterations in read_traces(path):
+        writer.write_block(n, i, iterations)
+    writer.close()
+
+def main():
+    import sys
+    usage = "Usage: python[3] traces.py <path_to_trace_file> [<path_to_btrace_or_tstore_file>] [zlib|lzma]"
+    if not 2 <= len(sys.argv) <= 4:
+        raise Exception(usage)
+    input_path = sys.argv[1]
+    output_path = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(input_path)[0] + ".btrace"
+    if output_path.endswith(".tstore"):
+        convert_to_store(input_path, output_path, *sys.argv[3:])
+    elif output_path.endswith(".btrace") and input_path.endswith(".trace"):
+        convert_text_traces(input_path, output_path)
+    else:
+        raise Exception(usage)
+    print(f"Saved traces at: {output_path}")
+
+if __name__ == "__main__":
+    main()
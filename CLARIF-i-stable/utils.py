@@ -3,6 +3,7 @@
 import random
 import math
 import itertools as it
+from operator import gt, lt, ne
 from copy import deepcopy
 from typing import Callable
 
@@ -11,10 +12,41 @@ from api.Learner import Learner
 from api.Rule import Rule
 from api.Action import Action
 from api.State import State
+from api.CompactState import CompactState
+from api.SparseRule import SparseRule
+from api.IndexedLearner import IndexedLearner
 
 # To speed things up in all cases we need some sort of memory, e.g., remember some parameters for each algorithm to save up time in rule generation
 # These should not be kept into the state itself but maybe some of the agents (learner? coach? TestCase? `target_rules` itself?)
 
+class SwapCallback:
+    """ Module-level (hence picklable) equivalent of a `swap_callback` closure, so that learners can be checkpointed. """
+    def __init__(self, left_key: str, right_key: str) -> None:
+        self.left_key: str = left_key
+        self.right_key: str = right_key
+
+    def __call__(self, state: State) -> State:
+        swapped_state = deepcopy(state)
+        swapped_state.swap(self.left_key, self.right_key)
+        return swapped_state
+
+class TriggeredRule:
+    """ Module-level (hence picklable) target rules of a sorting test case, so that its oracle can run in another process (see `api.Session`). """
+    def __init__(self, action_fn: Callable[[State, list[str]], tuple[State, Action, int]], keys: list[str]) -> None:
+        self.action_fn: Callable[[State, list[str]], tuple[State, Action, int]] = action_fn
+        self.keys: list[str] = keys
+
+    def __call__(self, state: State) -> Rule:
+        action_state, swap_action, priority = self.action_fn(state, self.keys)
+        # print(swap_action)
+        return Rule(
+            f"R({swap_action.name})",
+            action_state,
+            swap_action,
+            priority=priority,
+            explanation=swap_action.name, # maybe something more explicit
+        )
+
 def find_quick_swap_action(state: State, keys: list[str]) -> tuple[State, Action, int]:
     # print(f"State: {state}")
     n = len(keys)
@@ -43,10 +75,7 @@ def find_quick_swap_action(state: State, keys: list[str]) -> tuple[State, Action
                 return j
             left_key = keys[i]
             right_key = keys[j]
-            def swap_callback(state: State):
-                swapped_state = deepcopy(state)
-                swapped_state.swap(left_key, right_key)
-                return swapped_state
+            swap_callback = SwapCallback(left_key, right_key)
             swap_action = Action(swap_callback, f"swap({left_key}, {right_key})")
             # print("\tswap action", swap_action)
             return swap_action
@@ -91,10 +120,7 @@ def find_quick_partial_swap_action(state: State, keys: list[str]) -> tuple[State
                 return j
             left_key = keys[i]
             right_key = keys[j]
-            def swap_callback(state: State):
-                swapped_state = deepcopy(state)
-                swapped_state.swap(left_key, right_key)
-                return swapped_state
+            swap_callback = SwapCallback(left_key, right_key)
             swap_action = Action(swap_callback, f"swap({left_key}, {right_key})")
             # print("\tswap action", swap_action)
             priority -= 1
@@ -108,10 +134,7 @@ def find_bubble_swap_action(state: State, keys: list[str]) -> tuple[State, Actio
     for i in range(len(keys) - 1):
         cur_key, next_key = keys[i], keys[i + 1]
         if state.get(cur_key) > state.get(next_key):
-            def swap_callback(state: State):
-                swapped_state = deepcopy(state)
-                swapped_state.swap(cur_key, next_key)
-                return swapped_state
+            swap_callback = SwapCallback(cur_key, next_key)
             swap_action = Action(swap_callback, f"swap({cur_key}, {next_key})")
             return state, swap_action, 0
     return state, Action(), 0
@@ -123,15 +146,19 @@ def find_bubble_partial_swap_action(state: State, keys: list[str]) -> tuple[Stat
         cur_val = state.get(cur_key)
         next_val = state.get(next_key)
         if cur_val > next_val:
-            def swap_callback(state: State):
-                swapped_state = deepcopy(state)
-                swapped_state.swap(cur_key, next_key)
-                return swapped_state
+            swap_callback = SwapCallback(cur_key, next_key)
             swap_state = State({ cur_key: cur_val, next_key: next_val })
             swap_action = Action(swap_callback, f"swap({cur_key}, {next_key})")
             return swap_state, swap_action, n - i
     return State(), Action(), 0 # Maybe this should return the full state?
     
+def sorting_keys(n: int) -> list[str]:
+    """ State keys of a sorting test case of size `n`, zero-padded so that their sorted order is their index order. """
+    digit_count = lambda n: 1 if 0 else int(math.log10(abs(n))) + 1
+    pad_num = lambda n, p: '0' * (p - len((s := str(n)))) + s
+    d = digit_count(n)
+    return [ f"k{pad_num(i, d)}" for i in range(n) ]
+
 def generate_bubble_sort_partial_test_case(n: int, learner: Learner | None=None, full_reporting: bool = True, report_traces: bool = True, start_state: State = None, goal_state: State = None):
     return generate_sorting_test_case(n, find_bubble_partial_swap_action, learner, full_reporting, report_traces, start_state, goal_state)
 
@@ -146,10 +173,7 @@ def generate_quick_sort_test_case(n: int, learner: Learner | None=None, full_rep
 
 def generate_sorting_test_case(n: int, action_fn: Callable[[State, list[str]], State], learner: Learner | None=None, full_reporting: bool = True, report_traces: bool = True, start_state: State = None, goal_state: State = None) -> TestCase:
     # Generate start and goal states
-    digit_count = lambda n: 1 if 0 else int(math.log10(abs(n))) + 1
-    pad_num = lambda n, p: '0' * (p - len((s := str(n)))) + s
-    d = digit_count(n)
-    keys = [ f"k{pad_num(i, d)}" for i in range(n) ]
+    keys = sorting_keys(n)
     start_values = [ x for x in range(n) ]
     random.shuffle(start_values)
     start_state = State(dict(zip(keys, start_values))) if start_state == None else start_state
@@ -158,17 +182,58 @@ def generate_sorting_test_case(n: int, action_fn: Callable[[State, list[str]], S
     # Generate rules
     # states = ( State(dict(zip(keys, p))) for p in it.permutations(map(str, range(n))) )
     # TODO Rules need not be generated all at once, just a generator, or a something like that, since we have factorially many rules
-    def get_triggered_rule(state: State) -> Rule:
-        action_state, swap_action, priority = action_fn(state, keys)
-        # print(swap_action)
-        return Rule(
-            f"R({swap_action.name})",
-            action_state,
-            swap_action,
-            priority=priority,
-            explanation=swap_action.name, # maybe something more explicit
-        )
+    get_triggered_rule = TriggeredRule(action_fn, keys)
     # print("\n".join(map(str, target_rules)))
     test_case: TestCase = TestCase(start_state, goal_state, get_triggered_rule, learner, full_reporting, report_traces)
     return test_case
         
+
+# Large-n engine: oracles over `CompactState`s that compute the very same advice as `find_bubble_partial_swap_action` and
+# `find_quick_partial_swap_action` (given distinct values), with C-level scans instead of per-key lookups.
+
+def find_bubble_partial_swap_rule(state: CompactState, goal: list[int]) -> SparseRule:
+    values = state.values
+    n = len(values)
+    i = next(it.compress(it.count(), map(gt, values, it.islice(values, 1, None))), None)
+    if i is None:
+        return SparseRule((), (), 0)
+    return SparseRule(((i, values[i]), (i + 1, values[i + 1])), (i, i + 1), n - i)
+
+def find_quick_partial_swap_rule(state: CompactState, goal: list[int]) -> SparseRule:
+    """
+    With the first element of a range as its pivot, Hoare's partition only returns a split point when the pivot is the minimum of the range,
+    in which case the next range is the one right after the pivot. Hence, the first swap of quicksort is that of the first key whose value
+    is not the minimum of those after it (i.e., the first value out of (sorted) `goal`) with the last key after it holding a smaller value.
+    """
+    values = state.values
+    n = len(values)
+    low = next(it.compress(it.count(), map(ne, values, goal)), None)
+    if low is None:
+        return SparseRule((), (), 0)
+    pivot = values[low]
+    high = next(it.compress(it.count(n - 1, -1), map(lt, reversed(values), it.repeat(pivot))))
+    priority = n * n - low - (n - 1 - high) - 2 # as decremented along the recursion, partition and scans of `find_quick_partial_swap_action`
+    return SparseRule(((low, pivot), (high, values[high])), (low, high), priority)
+
+class TargetSparseRule:
+    """ Module-level (hence picklable) target rules of a compact sorting test case, as `TriggeredRule` for `generate_compact_sorting_test_case`. """
+    def __init__(self, rule_fn: Callable[[CompactState, list[int]], SparseRule], goal: list[int]) -> None:
+        self.rule_fn: Callable[[CompactState, list[int]], SparseRule] = rule_fn
+        self.goal: list[int] = goal
+
+    def __call__(self, state: CompactState) -> SparseRule:
+        return self.rule_fn(state, self.goal)
+
+def generate_bubble_sort_compact_test_case(n: int, learner: IndexedLearner | None = None, full_reporting: bool = True, report_traces: bool = True, start_state: CompactState = None, goal_state: CompactState = None):
+    return generate_compact_sorting_test_case(n, find_bubble_partial_swap_rule, learner, full_reporting, report_traces, start_state, goal_state)
+
+def generate_quick_sort_compact_test_case(n: int, learner: IndexedLearner | None = None, full_reporting: bool = True, report_traces: bool = True, start_state: CompactState = None, goal_state: CompactState = None):
+    return generate_compact_sorting_test_case(n, find_quick_partial_swap_rule, learner, full_reporting, report_traces, start_state, goal_state)
+
+def generate_compact_sorting_test_case(n: int, rule_fn: Callable[[CompactState, list[int]], SparseRule], learner: IndexedLearner | None = None, full_reporting: bool = True, report_traces: bool = True, start_state: CompactState = None, goal_state: CompactState = None) -> TestCase:
+    """ Large-n counterpart of `generate_sorting_test_case` (consuming `random` alike), over `CompactState`s, `SparseRule`s and an `IndexedLearner`. """
+    start_values = [ x for x in range(n) ]
+    random.shuffle(start_values)
+    start_state = CompactState(start_values) if start_state == None else start_state
+    goal_state = CompactState([ x for x in range(n) ]) if goal_state == None else goal_state
+    return TestCase(start_state, goal_state, TargetSparseRule(rule_fn, goal_state.values), learner if learner != None else IndexedLearner(), full_reporting, report_traces)